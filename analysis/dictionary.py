@@ -0,0 +1,44 @@
+import sys
+import rosslt
+from rosslt import codec
+
+
+def expression_samples(path):
+
+    # read one expression string per line
+    with open(path, "r", encoding="UTF-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            # data array encoding
+            expr = rosslt.Expression.from_string(line)
+            elements = bytearray()
+            data = bytearray()
+            codec.encode(expr.elements(), elements, data, rosslt.config.msg_dense)
+            yield elements
+            yield data
+
+            # string encoding
+            yield line.encode("UTF-8")
+
+
+def main(path_in, path_out, size=4096):
+
+    # train dictionary from recorded expressions
+    zdict = rosslt.compression.train_dictionary(expression_samples(path_in), size)
+    print(f"dictionary size: {len(zdict)}")
+
+    # write to file
+    with open(path_out, "wb") as f:
+        f.write(zdict)
+
+
+if __name__ == "__main__":
+
+    # usage: dictionary.py <expressions.txt> <dictionary.bin> [size]
+    if len(sys.argv) < 3:
+        print("usage: dictionary.py <expressions.txt> <dictionary.bin> [size]")
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], *map(int, sys.argv[3:4]))
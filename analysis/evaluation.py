@@ -192,7 +192,7 @@ def plot_provenance_tree_runtime(path_base):
         val = bench(x, is_raw, single)
 
         # object size
-        if type(val) is not rosslt.Tracked:
+        if not isinstance(val, rosslt.Tracked):
             return sys.getsizeof(val)
 
         # serialized size
@@ -25,8 +25,10 @@ expr_str = str(exp)
 
     a = min(timeit.Timer("rosslt.Expression.from_message(msg)", setup=setup).repeat(3, 1000))
     b = min(timeit.Timer("rosslt.Expression.from_string(expr_str)", setup=setup).repeat(3, 1000))
+    c = min(timeit.Timer("rosslt.Expression.from_string(expr_str).unpack()", setup=setup).repeat(3, 1000))
     print("from_message:   {:.6f}ms".format(a))
     print("from_string:    {:.6f}ms".format(b))
+    print("parse string:   {:.6f}ms".format(c))
 
 
 def main():
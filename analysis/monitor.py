@@ -236,7 +236,7 @@ class StateTab(ttk.Frame):
         # get type
         node_type = type(node)
         node_loc = None
-        if node_type is Tracked:
+        if issubclass(node_type, Tracked):
             node_type = type(getattr(node, "_data"))
             node_loc = node.get_location()
 
@@ -5,9 +5,11 @@ from .config import config, config_load, config_parse
 # load modules
 from .expression import Expression
 from .location import Location
+from .location_table import LocationTable
 from .operators import Operator
-from .tracked import Tracked
+from .tracked import Tracked, TrackedFloat, TrackedInt
 from .util import apply_random
+from . import compression, reference, strategy, stream
 
 
 # optionally load modules requiring rclpy
@@ -0,0 +1,388 @@
+from collections import Counter
+from struct import calcsize, pack, unpack_from
+import rosslt
+
+
+class ExpressionMsgElement:
+    INT32 = 1
+    INT64 = 2
+    DOUBLE = 3
+    COMPLEX = 4
+    STRING = 5
+    INT8 = 6
+    INT16 = 7
+    VARINT = 8
+    FLOAT32 = 9
+
+    # reference to shared fragment of location header
+    FRAGMENT = 10
+
+    # reference to expression stored by remote node
+    REFERENCE = 11
+
+    # operand fused with following operator: FUSED + (type index << 4) + operator code
+    FUSED = 128
+    FUSED_TYPES = (INT8, INT16, INT32, INT64, FLOAT32, DOUBLE, VARINT)
+
+
+class ExpressionMsgCompression:
+    NONE = 0
+    ZLIB = 1
+    STRING = 2
+    STRING_ZLIB = 3
+
+    # further codecs use the bits above the string flag
+    ZLIB_DICT = 4
+    LZMA = 8
+    BZ2 = 12
+
+    # compressed with shared stream context of previous messages
+    STREAM = 16
+
+    # contains references to expressions of remote nodes
+    REFERENCES = 32
+
+
+class LocationHeaderFlag:
+    KEYFRAME = 1
+    STREAM = 2
+
+    # changed locations relative to full header with same base
+    DELTA = 4
+    DELTA_KEYFRAME = 8
+
+
+class ExpressionBuffer:
+
+    def __init__(self, elements: bytearray = None, data: bytearray = None):
+        self.elements = bytearray() if elements is None else elements
+        self.data = bytearray() if data is None else data
+
+    def __len__(self):
+        return count(self.elements)
+
+    def __bool__(self):
+        return len(self.elements) > 0
+
+    @staticmethod
+    def from_history(history):
+
+        # encode history into new buffer using dense encoding
+        buffer = ExpressionBuffer()
+        encode(history, buffer.elements, buffer.data, True)
+        return buffer
+
+
+class ExpressionFragment:
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __eq__(self, other):
+        return type(other) is ExpressionFragment and self.index == other.index
+
+    def __hash__(self):
+        return hash((ExpressionFragment, self.index))
+
+    def __repr__(self):
+        return f"ExpressionFragment({self.index})"
+
+
+class ExpressionReference:
+
+    def __init__(self, node: str, loc_id: int, digest: int):
+        self.node = node
+        self.id = loc_id
+        self.digest = digest
+
+    def __eq__(self, other):
+        return type(other) is ExpressionReference and self.node == other.node and self.digest == other.digest
+
+    def __hash__(self):
+        return hash((ExpressionReference, self.node, self.digest))
+
+    def __repr__(self):
+        return f"ExpressionReference({self.node!r}, {self.id}, {self.digest:016x})"
+
+
+# struct format per data element
+_FORMATS = {
+    ExpressionMsgElement.INT8: "b",
+    ExpressionMsgElement.INT16: "h",
+    ExpressionMsgElement.INT32: "i",
+    ExpressionMsgElement.INT64: "q",
+    ExpressionMsgElement.FLOAT32: "f",
+    ExpressionMsgElement.DOUBLE: "d",
+}
+_FUSED_INDEX = {t: i for i, t in enumerate(ExpressionMsgElement.FUSED_TYPES)}
+
+
+def _element_type(element):
+
+    # data type of plain or fused element
+    if element >= ExpressionMsgElement.FUSED:
+        index = (element - ExpressionMsgElement.FUSED) >> 4
+        if index < len(ExpressionMsgElement.FUSED_TYPES):
+            return ExpressionMsgElement.FUSED_TYPES[index]
+    return element
+
+
+# translation of element codes into struct format characters
+# unsupported data elements are marked and operators are removed
+_FORMAT_TABLE = bytes(ord(_FORMATS.get(_element_type(i), "?")) for i in range(256))
+_FORMAT_DELETE = bytes(range(64, 128))
+_FUSED_DELETE = bytes(range(ExpressionMsgElement.FUSED))
+
+
+def _varint_encode(value):
+
+    # zigzag encoding for signed values
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+
+    # little endian base 128
+    result = bytearray()
+    while value > 0x7f:
+        result.append(value & 0x7f | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def _varint_decode(data, cursor):
+
+    # little endian base 128
+    value = shift = 0
+    while True:
+        byte = data[cursor]
+        cursor += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+
+    # zigzag decoding for signed values
+    return (value >> 1 if not value & 1 else -(value >> 1) - 1), cursor
+
+
+def _encode_reference(reference, elements, fmt, values):
+
+    # digest, location id and node name
+    node = reference.node.encode("UTF-8")
+    elements.append(ExpressionMsgElement.REFERENCE)
+    fmt.append(f"QiI{len(node)}s")
+    values.extend((reference.digest, reference.id, len(node), node))
+
+
+def encode(history, elements: bytearray, data: bytearray, dense=False):
+
+    # dense encoding is not readable by older decoders
+    if dense:
+        return _encode_dense(history, elements, data)
+
+    # collect element codes, operand format and operand values
+    operators = rosslt.Operator
+    fmt = ["<"]
+    values = []
+    for element in history:
+        element_type = type(element)
+        if element_type is operators:
+            elements.append(element.code + 64)
+        elif element_type is int:
+            if -2147483648 <= element <= 2147483647:
+                elements.append(ExpressionMsgElement.INT32)
+                fmt.append("i")
+            elif -9223372036854775808 <= element <= 9223372036854775807:
+                elements.append(ExpressionMsgElement.INT64)
+                fmt.append("q")
+            else:
+                elements.append(ExpressionMsgElement.DOUBLE)
+                fmt.append("d")
+            values.append(element)
+        elif element_type is float:
+            elements.append(ExpressionMsgElement.DOUBLE)
+            fmt.append("d")
+            values.append(element)
+        elif element_type is complex:
+            elements.append(ExpressionMsgElement.COMPLEX)
+            fmt.append("dd")
+            values.append(element.real)
+            values.append(element.imag)
+        elif element_type is str:
+            encoded = element.encode("UTF-8")
+            elements.append(ExpressionMsgElement.STRING)
+            fmt.append(f"I{len(encoded)}s")
+            values.append(len(encoded))
+            values.append(encoded)
+        elif element_type is ExpressionFragment:
+            elements.append(ExpressionMsgElement.FRAGMENT)
+            fmt.append("I")
+            values.append(element.index)
+        elif element_type is ExpressionReference:
+            _encode_reference(element, elements, fmt, values)
+
+    # pack all operands at once
+    data.extend(pack("".join(fmt), *values))
+
+
+def _encode_dense(history, elements: bytearray, data: bytearray):
+
+    # collect element codes, operand format and operand values
+    operators = rosslt.Operator
+    fmt = ["<"]
+    values = []
+    fusable = False
+    for element in history:
+        element_type = type(element)
+
+        # fuse operator with preceding operand
+        if element_type is operators:
+            if fusable:
+                elements[-1] = ExpressionMsgElement.FUSED + (_FUSED_INDEX[elements[-1]] << 4) + element.code
+            else:
+                elements.append(element.code + 64)
+            fusable = False
+            continue
+
+        # smallest lossless operand type
+        fusable = True
+        if element_type is int:
+            if -128 <= element <= 127:
+                elements.append(ExpressionMsgElement.INT8)
+                fmt.append("b")
+            elif -32768 <= element <= 32767:
+                elements.append(ExpressionMsgElement.INT16)
+                fmt.append("h")
+            elif -2147483648 <= element <= 2147483647:
+                elements.append(ExpressionMsgElement.INT32)
+                fmt.append("i")
+            elif -9223372036854775808 <= element <= 9223372036854775807:
+                elements.append(ExpressionMsgElement.INT64)
+                fmt.append("q")
+            else:
+                element = _varint_encode(element)
+                elements.append(ExpressionMsgElement.VARINT)
+                fmt.append(f"{len(element)}s")
+            values.append(element)
+        elif element_type is float:
+            try:
+                lossless = unpack_from("<f", pack("<f", element))[0] == element
+            except OverflowError:
+                lossless = False
+            elements.append(ExpressionMsgElement.FLOAT32 if lossless else ExpressionMsgElement.DOUBLE)
+            fmt.append("f" if lossless else "d")
+            values.append(element)
+        elif element_type is complex:
+            elements.append(ExpressionMsgElement.COMPLEX)
+            fmt.append("dd")
+            values.append(element.real)
+            values.append(element.imag)
+            fusable = False
+        elif element_type is str:
+            encoded = element.encode("UTF-8")
+            elements.append(ExpressionMsgElement.STRING)
+            fmt.append(f"I{len(encoded)}s")
+            values.append(len(encoded))
+            values.append(encoded)
+            fusable = False
+        elif element_type is ExpressionFragment:
+            elements.append(ExpressionMsgElement.FRAGMENT)
+            fmt.append("I")
+            values.append(element.index)
+            fusable = False
+        elif element_type is ExpressionReference:
+            _encode_reference(element, elements, fmt, values)
+            fusable = False
+        else:
+            fusable = False
+
+    # pack all operands at once
+    data.extend(pack("".join(fmt), *values))
+
+
+def iter_decode(elements, data):
+    # read data without copying slices
+    data = memoryview(data)
+    operators = rosslt.Operator.LIST
+    cursor = 0
+    for element in elements:
+
+        # check for operator
+        if 64 <= element < ExpressionMsgElement.FUSED:
+            yield operators[element - 64]
+            continue
+
+        # get value from data
+        value = None
+        element_type = _element_type(element)
+        if element_type in _FORMATS:
+            fmt = "<" + _FORMATS[element_type]
+            value = unpack_from(fmt, data, cursor)[0]
+            cursor += calcsize(fmt)
+        elif element_type == ExpressionMsgElement.VARINT:
+            value, cursor = _varint_decode(data, cursor)
+        elif element_type == ExpressionMsgElement.COMPLEX:
+            value = complex(*unpack_from("<dd", data, cursor))
+            cursor += 16
+        elif element_type == ExpressionMsgElement.STRING:
+            length = unpack_from("<i", data, cursor)[0]
+            value = str(data[cursor+4:cursor+4+length], "UTF-8")
+            cursor += 4 + length
+        elif element_type == ExpressionMsgElement.FRAGMENT:
+            value = ExpressionFragment(unpack_from("<I", data, cursor)[0])
+            cursor += 4
+        elif element_type == ExpressionMsgElement.REFERENCE:
+            digest, loc_id, length = unpack_from("<QiI", data, cursor)
+            value = ExpressionReference(str(data[cursor+16:cursor+16+length], "UTF-8"), loc_id, digest)
+            cursor += 16 + length
+
+        # pass value
+        yield value
+
+        # pass fused operator
+        if element >= ExpressionMsgElement.FUSED:
+            yield operators[element & 0xf]
+
+
+def count(elements):
+
+    # fused elements contain operand and operator
+    return len(elements) + len(bytes(elements).translate(None, _FUSED_DELETE))
+
+
+def histogram(elements):
+
+    # count operator codes of plain and fused elements
+    operators = rosslt.Operator.LIST
+    result = {}
+    for element, element_count in Counter(bytes(elements)).items():
+        if element >= 64:
+            operator = operators[element & 0xf if element >= ExpressionMsgElement.FUSED else element - 64]
+            result[operator] = result.get(operator, 0) + element_count
+    return result
+
+
+def decode(elements, data, history: list = None):
+
+    # decode into new or existing history
+    if history is None:
+        history = []
+
+    # translate element codes into struct format
+    fmt = bytes(elements).translate(_FORMAT_TABLE, _FORMAT_DELETE)
+    if b"?" in fmt:
+
+        # sequential decoding for complex and string operands
+        history.extend(iter_decode(elements, data))
+        return history
+
+    # split fused elements into operand and operator
+    elements = bytes(elements)
+    for element in set(elements):
+        if element >= ExpressionMsgElement.FUSED:
+            elements = elements.replace(bytes((element,)), bytes((1, (element & 0xf) + 64)))
+
+    # unpack all operands at once and merge with operators
+    operators = rosslt.Operator.LIST
+    values = iter(unpack_from("<" + fmt.decode("ASCII"), data)).__next__
+    history.extend([operators[e - 64] if e >= 64 else values() for e in elements])
+    return history
@@ -0,0 +1,128 @@
+from collections import Counter
+from typing import Iterable
+import bz2
+import lzma
+import zlib
+import rosslt
+from .codec import ExpressionMsgCompression
+
+
+class Codec:
+
+    def __init__(self, code, name, compress, decompress):
+        self.code = code
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+    def __repr__(self):
+        return f"Codec({self.name})"
+
+
+# registered codecs by code and name
+CODECS = {}
+
+# preset dictionaries by adler32 checksum
+DICTIONARIES = {}
+_dictionary = None
+
+
+def register(codec: Codec):
+
+    # make codec available by code and name
+    CODECS[codec.code] = codec
+    CODECS[codec.name] = codec
+
+
+def get(key):
+
+    # look up codec by code or name
+    try:
+        return CODECS[key]
+    except KeyError:
+        raise ValueError(f"unknown compression codec: {key}") from None
+
+
+def add_dictionary(zdict: bytes, active=True):
+
+    # register dictionary by checksum stored in zlib header
+    zdict = bytes(zdict)
+    DICTIONARIES[zlib.adler32(zdict)] = zdict
+
+    # use dictionary for compression
+    if active:
+        global _dictionary
+        _dictionary = zdict
+
+    return zdict
+
+
+def load_dictionary(path, active=True):
+
+    # read dictionary file
+    with open(path, "rb") as f:
+        return add_dictionary(f.read(), active)
+
+
+def get_dictionary():
+
+    # load dictionary from config on first use
+    if _dictionary is None and rosslt.config.compression_dict:
+        load_dictionary(rosslt.config.compression_dict)
+
+    if _dictionary is None:
+        raise RuntimeError("no compression dictionary available")
+    return _dictionary
+
+
+def train_dictionary(samples: Iterable[bytes], size=4096, length=8):
+
+    # count in how many samples each substring appears
+    counts = Counter()
+    for sample in samples:
+        sample = bytes(sample)
+        counts.update({sample[i:i+length] for i in range(len(sample) - length + 1)})
+
+    # keep substrings shared between samples
+    chunks = [x for x, n in counts.most_common(size // length) if n > 1]
+
+    # most frequent substrings at the end are cheapest to reference
+    return b"".join(reversed(chunks))
+
+
+def _zlib_dict_compress(data, level):
+
+    # compress with active preset dictionary
+    compressor = zlib.compressobj(level, zdict=get_dictionary())
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zlib_dict_decompress(data, size):
+
+    # dictionary checksum follows the two byte zlib header
+    data = bytes(data)
+    checksum = int.from_bytes(data[2:6], "big")
+    if checksum not in DICTIONARIES:
+        raise RuntimeError(f"unknown compression dictionary: {checksum:08x}")
+
+    # decompress with matching preset dictionary
+    decompressor = zlib.decompressobj(zdict=DICTIONARIES[checksum])
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+# default codecs
+register(Codec(ExpressionMsgCompression.NONE, "none",
+               lambda data, level: data,
+               lambda data, size: data))
+register(Codec(ExpressionMsgCompression.ZLIB, "zlib",
+               lambda data, level: zlib.compress(data, level),
+               lambda data, size: zlib.decompress(data, bufsize=size or zlib.DEF_BUF_SIZE)))
+register(Codec(ExpressionMsgCompression.ZLIB_DICT, "zlib_dict",
+               _zlib_dict_compress,
+               _zlib_dict_decompress))
+register(Codec(ExpressionMsgCompression.LZMA, "lzma",
+               lambda data, level: lzma.compress(data, preset=min(max(level, 0), 9)),
+               lambda data, size: lzma.decompress(data)))
+register(Codec(ExpressionMsgCompression.BZ2, "bz2",
+               lambda data, level: bz2.compress(data, min(max(level, 1), 9)),
+               lambda data, size: bz2.decompress(data)))
@@ -7,13 +7,37 @@ class Config:
     # expression
     expr_chain = True
 
+    # evaluations before a history gets compiled into a python function, 0 disables,
+    # longer histories are only compiled explicitly as exec stalls for about 35 evaluations
+    expr_compile = 8
+    expr_compile_max = 1024
+    expr_affine = False
+
     # message
     msg_str = False
+    msg_dense = False
+    msg_adaptive = False
+    msg_adaptive_budget = 0.0005
+    msg_references = False
+    reference_min = 16
+    reference_cache = 256
+    reference_timeout = 1.0
+    header_cache = 64
+    header_fragments = False
 
     # compression
     zlib_enable = True
     zlib_level = 1
     zlib_threshold = 1024
+    compression_codec = "zlib"
+    compression_dict = ""
+
+    # stream
+    stream_level = 6
+    stream_keyframe = 100
+    stream_keyframe_retry = 1.0
+    stream_delta = False
+    delta_keyframe = 50
 
 
 # static instance
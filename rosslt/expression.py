@@ -1,36 +1,91 @@
-from itertools import chain
+from ast import literal_eval
+from collections import Counter
+from functools import lru_cache
+from itertools import chain, islice
 from typing import Iterable
-from struct import pack, unpack
-import zlib
+import math
+import re
 import rosslt
+from .codec import ExpressionBuffer, ExpressionMsgCompression, ExpressionMsgElement, ExpressionReference, \
+    encode, iter_decode, decode, count, histogram
 
 # optional dependencies
 try:
     import rosslt_py_msgs.msg
 except ModuleNotFoundError:
     pass
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    pass
+
+# string tokens separated by semicolons, quoted strings may contain separators
+_TOKEN = re.compile(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^;]+""")
+
+# operator tokens, filled on first use
+_TOKENS = {}
+
+
+# recently parsed literals
+@lru_cache(maxsize=4096)
+def _literal(part):
+
+    # dispatch on first and last character
+    first = part[0]
+    if first == "'" or first == '"':
+        value = literal_eval(part)
+    elif first == "(" or part[-1] == "j":
+        value = complex(part)
+    else:
+
+        # integers first, floats include exponents, inf and nan
+        try:
+            value = int(part)
+        except ValueError:
+            value = float(part)
 
+    return value
 
-class ExpressionMsgElement:
-    INT32 = 1
-    INT64 = 2
-    DOUBLE = 3
-    COMPLEX = 4
-    STRING = 5
 
+class ExpressionChunk:
 
-class ExpressionMsgCompression:
-    NONE = 0
-    ZLIB = 1
-    STRING = 2
-    STRING_ZLIB = 3
+    __slots__ = ("parent", "items", "stop", "length", "reference")
+
+    def __init__(self, parent: "ExpressionChunk", items: tuple, stop: int = None, reference=None):
+        self.parent = parent
+        self.items = items
+        self.stop = len(items) if stop is None else stop
+        self.length = self.stop + (parent.length if parent else 0)
+
+        # upstream expression referable by own messages, valid while chunk is complete
+        self.reference = reference
+
+    def __iter__(self):
+
+        # collect chunks from root to leaf
+        chunks = []
+        chunk = self
+        while chunk is not None:
+            chunks.append(chunk)
+            chunk = chunk.parent
+
+        # iterate shared elements in order
+        return chain.from_iterable(islice(c.items, c.stop) for c in reversed(chunks))
 
 
 class Expression:
 
+    # maximum size of the private history tail before it gets shared
+    TAIL_SIZE = 32
+
+    # compact layout, one instance per tracked field
+    __slots__ = ("_history", "_packed", "_base", "_cache")
+
     def __init__(self, history: Iterable = None, packed=None):
         self._history = list(history or [])
         self._packed = packed
+        self._base = None
+        self._cache = None
 
     def __add__(self, other: list | tuple):
 
@@ -38,12 +93,22 @@ class Expression:
         if other is None or not len(other):
             return self
 
-        # copy and append to history
-        history = list(self.history())
-        Expression._append(history, other)
+        # share history except for the elements chaining may rewrite
+        if self._packed is not None:
+            self.unpack()
+        window = Expression._window(other)
+        if len(self._history) > window + Expression.TAIL_SIZE:
+            self._share(window)
+
+        # derive expression from shared history and copied tail
+        expr = Expression(self._history)
+        if self._base is not None:
+            expr._base = self._base
+            expr._thaw(window)
+        Expression._append(expr._history, other)
 
         # create expression with new history
-        return Expression(history)
+        return expr
 
     def __iadd__(self, other: list | tuple):
 
@@ -52,7 +117,10 @@ class Expression:
             return self
 
         # append to history
-        Expression._append(self.history(), other)
+        self.unpack()
+        self._thaw(Expression._window(other))
+        Expression._append(self._history, other)
+        self._invalidate()
 
         # self reference
         return self
@@ -60,23 +128,33 @@ class Expression:
     def __str__(self):
 
         # fast pass if still packed as string
-        if type(self._packed) is str:
-            return self._packed
+        if self._packed is not None:
+            source = self._source()
+            if type(source) is str:
+                return source
 
         # build string
-        return ';'.join(repr(x) for x in self.history())
+        return ';'.join(repr(x) for x in self.elements())
 
     def __repr__(self):
         return "Expression({})".format(str(self))
 
     def __len__(self):
-        return len(self.history())
+
+        # count elements in packed state
+        if self._packed is not None:
+            source = self._source()
+            if type(source) is str:
+                return sum(1 for x in Expression._tokenize(source) if x)
+            return count(source[0])
+
+        return len(self._history) + (self._base.length if self._base else 0)
 
     def __bool__(self):
 
         # fast pass for packed state
         if self._packed:
-            if type(self._packed) is str:
+            if type(self._packed) is str or type(self._packed) is ExpressionBuffer:
                 return True
             elif type(self._packed) is rosslt_py_msgs.msg.Expression:
                 return self._packed.elements_size > 0 or self._packed.data_size > 0
@@ -101,8 +179,19 @@ class Expression:
             # copy value to  stack
             stack.append(arg)
 
+        # use compiled function if available
+        cache = self._cached()
+        compiled = cache.get(len(stack))
+        if compiled is not None:
+            return compiled(*stack)
+
+        # compile short histories after repeated evaluation
+        calls = cache["calls"] = cache.get("calls", 0) + 1
+        if 0 < rosslt.config.expr_compile <= calls and len(self) <= rosslt.config.expr_compile_max:
+            return self.compile(len(stack))(*stack)
+
         # iterate elements in history
-        for cur_element in self.history():
+        for cur_element in self._resolved():
 
             # check for operator
             if type(cur_element) is rosslt.Operator:
@@ -127,15 +216,84 @@ class Expression:
         if len(stack):
             return stack[-1]
 
+    def evaluate_batch(self, *args):
+
+        # initialize stack with arrays
+        stack = [np.asarray(arg) for arg in args]
+
+        # raise on division by zero and domain errors like the scalar path
+        with np.errstate(divide="raise", invalid="raise"):
+
+            # iterate elements in history once for the whole batch
+            for cur_element in self._resolved():
+
+                # check for operator
+                if type(cur_element) is rosslt.Operator:
+
+                    # check minimum size
+                    arg_count = cur_element.arg_count
+                    if len(stack) >= arg_count:
+
+                        # apply operator
+                        if cur_element is rosslt.Operator.SWAP:
+                            stack[-1], stack[-2] = stack[-2], stack[-1]
+                        else:
+                            operands = stack[-arg_count:]
+                            try:
+                                result = cur_element.ufunc(*operands)
+                            except FloatingPointError as e:
+                                result = Expression._batch_error(cur_element, operands, e)
+                            stack[-arg_count:] = [result]
+
+                else:
+
+                    # push element on stack
+                    stack.append(cur_element)
+
+        # return last value on stack
+        if len(stack):
+            return np.asarray(stack[-1])
+
+    @staticmethod
+    def _batch_error(operator, operands, error):
+
+        # division by zero, including zero by zero and zero to negative powers
+        division = operator is rosslt.Operator.DIV or operator is rosslt.Operator.DIV_FLOOR
+        if "divide by zero" in str(error) or division and np.any(np.equal(operands[-1], 0)):
+            raise ZeroDivisionError(str(error)) from error
+
+        # fractional powers of negative bases are complex
+        if operator is rosslt.Operator.POW or operator is rosslt.Operator.IPOW:
+            return operator.ufunc(np.asarray(operands[0], dtype=complex), *operands[1:])
+
+        # out of domain for math functions, e.g. asin or sin of infinity
+        if operator in (rosslt.Operator.SIN, rosslt.Operator.COS, rosslt.Operator.ASIN, rosslt.Operator.ACOS):
+            raise ValueError("math domain error") from error
+
+        # undefined arithmetic like inf - inf is nan without error
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return operator.ufunc(*operands)
+
     def __reversed__(self):
 
+        # reuse reversed expression until history changes
+        cache = self._cached()
+        expr = cache.get("reversed")
+        if expr is None:
+            expr = cache["reversed"] = self._reverse()
+
+        # pass view sharing history and compiled functions
+        return expr._view()
+
+    def _reverse(self):
+
         # start with empty part and list
         part = []
         part_list = []
         swap_mode = False
 
         # iterate elements in history
-        for cur_element in self.history():
+        for cur_element in self._resolved():
 
             # check for operator
             if type(cur_element) is rosslt.Operator:
@@ -178,9 +336,112 @@ class Expression:
         # join parts in reverse
         part_list = chain.from_iterable(reversed(part_list))
 
-        # return new expression
+        # return new expression, reversed packed expressions stay packed
+        if self._packed is not None:
+            return Expression(packed=ExpressionBuffer.from_history(part_list))
         return Expression(part_list)
 
+    @staticmethod
+    def _window(buffer):
+
+        # chaining rewrites at most three history elements per buffer element
+        return 3 * len(buffer) + 3
+
+    def _share(self, window):
+
+        # keep small tails private
+        if len(self._history) <= window + Expression.TAIL_SIZE:
+            return
+
+        # move everything but the window into an immutable chunk
+        self._base = ExpressionChunk(self._base, tuple(self._history[:-window]))
+        del self._history[:-window]
+
+    def _thaw(self, window):
+
+        # copy shared elements into private tail until the window is covered
+        while self._base is not None and len(self._history) < window:
+            base = self._base
+            count = min(base.stop, window - len(self._history))
+            self._history[:0] = base.items[base.stop - count:base.stop]
+
+            # shrink view on shared chunk
+            if count < base.stop:
+                self._base = ExpressionChunk(base.parent, base.items, base.stop - count, base.reference)
+            else:
+                self._base = base.parent
+
+    @staticmethod
+    def _affine_pair(history, index, operators):
+
+        # check for numeric operand followed by operator
+        if index >= 2 and history[index - 1] in operators:
+            operand = history[index - 2]
+            if type(operand) is int or type(operand) is float:
+                return operand, history[index - 1]
+        return None, None
+
+    @staticmethod
+    def _affine_tail(history):
+
+        # trailing offset
+        scale, offset, size = 1, 0, 0
+        index = len(history)
+        operand, operator = Expression._affine_pair(
+            history, index, (rosslt.Operator.ADD, rosslt.Operator.SUB))
+        if operator is not None:
+            offset = operand if operator is rosslt.Operator.ADD else -operand
+            size = 2
+
+        # scale before offset
+        operand, operator = Expression._affine_pair(history, index - size, (rosslt.Operator.MUL,))
+        if operator is not None:
+            scale = operand
+            size += 2
+
+        # operand below the affine part has to be the running value
+        if size < len(history) and type(history[-size - 1]) is not rosslt.Operator:
+            return 1, 0, 0
+
+        # return affine pair and number of elements it replaces
+        return scale, offset, size
+
+    @staticmethod
+    def _append_affine(history, buffer):
+
+        # check for single operator with numeric operand
+        if len(buffer) not in (2, 3) or type(buffer[0]) not in (int, float):
+            return False
+        swap = len(buffer) == 3
+        operand, operator = buffer[0], buffer[-1]
+        if swap and buffer[1] is not rosslt.Operator.SWAP:
+            return False
+
+        # apply operator to affine pair
+        scale, offset, size = Expression._affine_tail(history)
+        if operator is rosslt.Operator.ADD:
+            offset = offset + operand
+        elif operator is rosslt.Operator.SUB:
+            if swap:
+                scale, offset = -scale, operand - offset
+            else:
+                offset = offset - operand
+        elif operator is rosslt.Operator.MUL:
+            scale, offset = scale * operand, offset * operand
+        elif operator is rosslt.Operator.DIV and not swap:
+            scale, offset = scale / operand, offset / operand
+        else:
+            return False
+
+        # replace tail with canonical form
+        if size:
+            del history[-size:]
+        if scale != 1:
+            history.extend((scale, rosslt.Operator.MUL))
+        if offset != 0:
+            history.extend((offset, rosslt.Operator.ADD))
+        return True
+
     @staticmethod
     def _append(history, buffer):
 
@@ -188,6 +449,10 @@ class Expression:
         if buffer is None or not len(buffer):
             return history
 
+        # keep add/sub/mul/div runs as scale and offset
+        if rosslt.config.expr_affine and Expression._append_affine(history, buffer):
+            return history
+
         # check for buffer operator with operand
         if rosslt.config.expr_chain and len(buffer) > 1:
 
@@ -283,6 +548,126 @@ class Expression:
         history.extend(buffer)
         return history
 
+    def _invalidate(self):
+
+        # drop state derived from history
+        self._cache = None
+
+    def _cached(self):
+
+        # derived state, allocated on first use
+        if self._cache is None:
+            self._cache = {}
+        return self._cache
+
+    def _resolved(self):
+
+        # elements with remote references replaced, checked once per history
+        cache = self._cached()
+        resolved = cache.get("resolved")
+        if resolved is None:
+
+            # packed buffers are only decoded if they may contain references
+            source = self._source() if self._packed is not None else None
+            if type(source) is str or source is not None and ExpressionMsgElement.REFERENCE not in source[0]:
+                references = False
+            else:
+                references = any(type(x) is ExpressionReference for x in self.elements())
+            resolved = cache["resolved"] = rosslt.reference.expand(self.elements()) if references else False
+        return self.elements() if resolved is False else resolved
+
+    def _view(self):
+
+        # move history into immutable chunk
+        if self._history:
+            self._base = ExpressionChunk(self._base, tuple(self._history))
+            self._history = []
+
+        # create expression sharing history, packed source and derived state
+        expr = Expression()
+        expr._base = self._base
+        expr._packed = self._packed
+        expr._cache = self._cached()
+        return expr
+
+    @staticmethod
+    def _literal(value):
+
+        # values with exact source representation
+        value_type = type(value)
+        if value_type is int or value_type is str or value_type is float and math.isfinite(value):
+            return f"({value!r})"
+
+    @staticmethod
+    def _compile(elements, arg_count):
+
+        # symbolic stack of slot variables and constant literals
+        stack = [f"s{i}" for i in range(arg_count)]
+        lines = []
+        namespace = {"math": math}
+
+        # iterate elements in history
+        for cur_element in elements:
+
+            # check for operator
+            if type(cur_element) is rosslt.Operator:
+
+                # skip operator if stack is too small
+                if len(stack) < cur_element.arg_count:
+                    continue
+
+                # get operands and result slot
+                index = len(stack) - cur_element.arg_count
+                operands = stack[index:]
+
+                # check for swap
+                if cur_element is rosslt.Operator.SWAP:
+
+                    # constants can be swapped symbolically
+                    stack[-1], stack[-2] = stack[-2], stack[-1]
+                    if stack[-1][0] == "s" or stack[-2][0] == "s":
+
+                        # keep slot variables in stack order
+                        lines.append(f"s{index}, s{index + 1} = {stack[-2]}, {stack[-1]}")
+                        stack[-2:] = [f"s{index}", f"s{index + 1}"]
+
+                else:
+
+                    # apply operator to result slot
+                    lines.append(f"s{index} = " + cur_element.source.format(*operands))
+                    stack[index:] = [f"s{index}"]
+
+            else:
+
+                # push literal or constant from namespace
+                literal = Expression._literal(cur_element)
+                if literal is None:
+                    literal = f"k{len(namespace)}"
+                    namespace[literal] = cur_element
+                stack.append(literal)
+
+        # return last value on stack
+        lines.append(f"return {stack[-1]}" if len(stack) else "return None")
+
+        # generate function
+        args = ", ".join(f"s{i}" for i in range(arg_count))
+        source = f"def expression({args}):\n    " + "\n    ".join(lines)
+        exec(source, namespace)
+        return namespace["expression"]
+
+    def compile(self, arg_count=1):
+
+        # get cached function
+        cache = self._cached()
+        compiled = cache.get(arg_count)
+        if compiled is None:
+
+            # lower history into python function
+            compiled = Expression._compile(self._resolved(), arg_count)
+            cache[arg_count] = compiled
+
+        return compiled
+
     def apply(self, *args):
         return self(*args)
 
@@ -292,168 +677,240 @@ class Expression:
 
     def history(self):
         self.unpack()
-        return self._history
+
+        # copy including shared history, internal list and cache stay untouched
+        return list(self.elements())
+
+    def elements(self):
+
+        # decode packed state on the fly
+        if self._packed is not None:
+            source = self._source()
+            if type(source) is str:
+                return iter(Expression._parse(source))
+            return iter_decode(source[0], source[1])
+
+        # iterate without flattening shared history
+        if self._base is not None:
+            return chain(self._base, self._history)
+        return iter(self._history)
 
     def packed(self):
         return self._packed is not None
 
-    def unpack(self):
+    def compact(self):
 
-        # check type
-        if self._packed is None:
+        # encode history into opcode and operand buffers
+        if type(self._packed) is not ExpressionBuffer:
+            self._packed = ExpressionBuffer.from_history(self.elements())
 
-            # already unpacked
-            return
+        # free history and derived state
+        self._history = []
+        self._base = None
+        self._invalidate()
 
-        elif type(self._packed) is str:
+    @staticmethod
+    def _tokenize(history_str):
 
-            # iterate parts
-            history = self._history
-            for part in self._packed.split(";"):
+        # quoted strings may contain separators
+        if "'" in history_str or '"' in history_str:
+            return _TOKEN.findall(history_str)
+        return history_str.split(";")
 
-                # guard against leading/trailing/duplicate parts
-                if len(part):
+    @staticmethod
+    def _parse(history_str):
+
+        # fast pass if all tokens are operators
+        tokens = _TOKENS
+        if not tokens:
+            tokens.update(rosslt.Operator.MAP)
+        parts = Expression._tokenize(history_str)
+        if all(map(tokens.__contains__, parts)):
+            return list(map(tokens.__getitem__, parts))
+
+        # parse unknown tokens, guard against leading/trailing/duplicate parts
+        return [tokens[x] if x in tokens else _literal(x) for x in parts if x]
+
+    def _source(self):
+
+        # packed string or compact buffers
+        packed = self._packed
+        if type(packed) is str:
+            return packed
+        elif type(packed) is ExpressionBuffer:
+            return packed.elements, packed.data
+
+        # message buffers
+        data = packed.data
+        elements = packed.elements
+        compression = packed.compression
+
+        # decompress once using codec without string and reference flags
+        codec = compression & ~ExpressionMsgCompression.STRING & ~ExpressionMsgCompression.REFERENCES
+        if codec != ExpressionMsgCompression.NONE:
+            cache = self._cached()
+            source = cache.get("source")
+            if source is not None:
+                return source
+            codec = rosslt.compression.get(codec)
+            data = codec.decompress(data, packed.data_size)
+            elements = codec.decompress(elements, packed.elements_size)
 
-                    # check for operator
-                    if part in rosslt.Operator.MAP:
+            # check for string message
+            if compression & ExpressionMsgCompression.STRING:
+                source = cache["source"] = bytes(data).decode("UTF-8")
+            else:
+                source = cache["source"] = elements, data
+            return source
 
-                        # append operator to history
-                        history.append(rosslt.Operator.MAP[part])
+        # check for string message
+        if compression & ExpressionMsgCompression.STRING:
+            return bytes(data).decode("UTF-8")
 
-                    else:
+        # pass element and data buffers
+        return elements, data
 
-                        # append value to history
-                        if part.startswith("'") or part.startswith('"'):
-                            history.append(part[1:len(part)-1])
-                        elif "j" in part:
-                            history.append(complex(part))
-                        elif "." in part:
-                            history.append(float(part))
-                        else:
-                            history.append(int(part))
+    def histogram(self):
 
-        elif type(self._packed) is rosslt_py_msgs.msg.Expression:
-            # unpack from message
+        # count operators in packed state without decoding operands
+        if self._packed is not None:
+            source = self._source()
+            if type(source) is str:
+                operators = rosslt.Operator.MAP
+                return dict(Counter(operators[x] for x in Expression._tokenize(source) if x in operators))
+            return histogram(source[0])
 
-            # prepare
-            msg = self._packed
-            history = self._history
-            data = bytes(msg.data)
-            elements = bytes(msg.elements)
-            operators = rosslt.Operator.LIST
-            compression = msg.compression
+        # count operators in history
+        return dict(Counter(x for x in self.elements() if type(x) is rosslt.Operator))
 
-            # decompress zlib
-            if compression in (ExpressionMsgCompression.ZLIB, ExpressionMsgCompression.STRING_ZLIB):
-                compression -= ExpressionMsgCompression.ZLIB
-                data = zlib.decompress(msg.data, bufsize=msg.data_size)
-                elements = zlib.decompress(msg.elements, bufsize=msg.elements_size)
+    def invertible(self):
 
-            # check for string message
-            if compression == ExpressionMsgCompression.STRING:
+        # check for operators losing information
+        return all(x.invertible for x in self.histogram())
 
-                # decode from data array
-                self._packed = data.decode("UTF-8")
-                self.unpack()
-                return
+    def unpack(self):
 
-            else:
+        # check type
+        if self._packed is None:
 
-                # read data
-                cursor = 0
-                for element in elements:
-
-                    # check for data type
-                    if element < 64:
-
-                        # get value from data
-                        value = None
-                        if element == ExpressionMsgElement.INT32:
-                            value = int.from_bytes(data[cursor:cursor+4], "little", signed=True)
-                            cursor += 4
-                        elif element == ExpressionMsgElement.INT64:
-                            value = int.from_bytes(data[cursor:cursor+8], "little", signed=True)
-                            cursor += 8
-                        elif element == ExpressionMsgElement.DOUBLE:
-                            value = unpack("<d", data[cursor:cursor+8])[0]
-                            cursor += 8
-                        elif element == ExpressionMsgElement.COMPLEX:
-                            value_real = unpack("<d", data[cursor:cursor+8])[0]
-                            value_imag = unpack("<d", data[cursor+8:cursor+16])[0]
-                            value = complex(value_real, value_imag)
-                            cursor += 16
-                        elif element == ExpressionMsgElement.STRING:
-                            length = int.from_bytes(data[cursor:cursor+4], "little", signed=True)
-                            value = data[cursor+4:cursor+4+length].decode("UTF-8")
-                            cursor += 4 + length
-
-                        # append to history
-                        history.append(value)
-
-                    else:
-
-                        # add operator
-                        history.append(operators[element - 64])
+            # already unpacked
+            return
+
+        # decode string or buffers
+        source = self._source()
+        if type(source) is str:
+            self._history.extend(Expression._parse(source))
+        else:
+            decode(source[0], source[1], self._history)
 
         # mark as unpacked and free memory
         self._packed = None
 
+        # received history stays shared and referable by own messages
+        upstream = self._cache.get("upstream") if self._cache else None
+        if upstream is not None:
+            self._base = ExpressionChunk(None, tuple(self._history), reference=upstream)
+            self._history = []
+
     def to_message(self):
 
-        # fast pass if packed
-        if type(self._packed) is rosslt_py_msgs.msg.Expression:
+        # fast pass if packed, received history is referred to instead
+        if type(self._packed) is rosslt_py_msgs.msg.Expression \
+                and not (rosslt.config.msg_references and self._cache and "upstream" in self._cache):
             return self._packed
 
+        # choose encoding per message
+        if rosslt.config.msg_adaptive:
+            msg, self._cached()["choice"] = rosslt.strategy.adaptive.to_message(self)
+            return msg
+
+        # reuse message encoded with same settings
+        config = rosslt.config
+        signature = (config.msg_str, config.msg_dense, config.msg_references, config.zlib_enable,
+                     config.zlib_level, config.zlib_threshold, config.compression_codec, config.compression_dict)
+        cache = self._cached()
+        cached = cache.get("message")
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        # static encoding from config
+        level = config.zlib_level if config.zlib_enable else None
+        msg = self._encode_message(config.msg_str, level, config.zlib_threshold)
+        cache["message"] = (signature, msg)
+        return msg
+
+    def message_choice(self):
+
+        # strategy chosen for last adaptive message
+        return self._cache.get("choice") if self._cache else None
+
+    def _reference(self):
+
+        # received message is decoded into shared chunk
+        if rosslt.reference.node is None:
+            return None
+        if self._packed is not None and self._cache and "upstream" in self._cache:
+            self.unpack()
+
+        # root chunk received from upstream node, short histories are sent completely
+        root = self._base
+        while root is not None and root.parent is not None:
+            root = root.parent
+        if root is None or root.reference is None or len(root.items) < rosslt.config.reference_min:
+            return None
+
+        # elements copied from the chunk must still be unchanged
+        tail = root.items[root.stop:]
+        copied = tuple(islice(self.elements(), root.stop, len(root.items)))
+        if len(copied) != len(tail) or any(type(a) is not type(b) or a != b for a, b in zip(copied, tail)):
+            return None
+        return root
+
+    def _encode_message(self, msg_str, level, threshold):
+
         # create empty message
-        elements = []
-        data = []
+        elements = bytearray()
+        data = bytearray()
 
         # check for message string option
-        if rosslt.config.msg_str:
+        if msg_str:
 
             # save string representation in data array
             compression = ExpressionMsgCompression.STRING
             data.extend(str(self).encode("UTF-8"))
 
+        elif type(self._packed) is ExpressionBuffer and rosslt.config.msg_dense:
+
+            # copy compact buffers
+            compression = ExpressionMsgCompression.NONE
+            elements = self._packed.elements
+            data = self._packed.data
+
+        elif rosslt.config.msg_references and self._reference() is not None:
+
+            # refer to upstream history instead of sending it
+            root = self._reference()
+            compression = ExpressionMsgCompression.REFERENCES
+            history = chain((root.reference.publish(root.items),), islice(self.elements(), len(root.items), None))
+            encode(history, elements, data, rosslt.config.msg_dense)
+
         else:
 
             # build data arrays
             compression = ExpressionMsgCompression.NONE
-            for element in self.history():
-                if type(element) is rosslt.Operator:
-                    elements.append(element.code + 64)
-                elif type(element) is int:
-                    if -2147483648 <= element <= 2147483647:
-                        elements.append(ExpressionMsgElement.INT32)
-                        data.extend(element.to_bytes(4, "little", signed=True))
-                    elif -9223372036854775808 <= element <= 9223372036854775807:
-                        elements.append(ExpressionMsgElement.INT64)
-                        data.extend(element.to_bytes(8, "little", signed=True))
-                    else:
-                        elements.append(ExpressionMsgElement.DOUBLE)
-                        data.extend(pack("<d", element))
-                elif type(element) is float:
-                    elements.append(ExpressionMsgElement.DOUBLE)
-                    data.extend(pack("<d", element))
-                elif type(element) is complex:
-                    elements.append(ExpressionMsgElement.COMPLEX)
-                    data.extend(pack("<d", element.real))
-                    data.extend(pack("<d", element.imag))
-                elif type(element) is str:
-                    elements.append(ExpressionMsgElement.STRING)
-                    data.extend(len(element).to_bytes(4, "little"))
-                    data.extend(element.encode("UTF-8"))
+            encode(self.elements(), elements, data, rosslt.config.msg_dense)
 
         # compression
         elements_size = len(elements)
         data_size = len(data)
-        if rosslt.config.zlib_enable:
-            if max(len(elements), len(data)) > rosslt.config.zlib_threshold:
-
-                # compress using zlib
-                compression += ExpressionMsgCompression.ZLIB
-                elements = zlib.compress(bytes(elements), rosslt.config.zlib_level)
-                data = zlib.compress(bytes(data), rosslt.config.zlib_level)
+        if level is not None:
+            if max(len(elements), len(data)) > threshold:
+
+                # compress using configured codec
+                codec = rosslt.compression.get(rosslt.config.compression_codec)
+                compression += codec.code
+                elements = codec.compress(bytes(elements), level)
+                data = codec.compress(bytes(data), level)
 
         # complete
         return rosslt_py_msgs.msg.Expression(
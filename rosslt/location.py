@@ -10,13 +10,55 @@ except ModuleNotFoundError:
 
 class Location:
 
+    # compact layout, one instance per tracked field
+    __slots__ = ("id", "node", "ref", "force", "_expr", "_content", "_shared", "_message", "_table")
+
     def __init__(self, node="", loc_id=-1, expr=None, content=None):
         self.id = loc_id
         self.node = node
-        self.expr = expr or rosslt.Expression()
-        self.content = content
+        self._expr = expr
         self.ref = None
         self.force = None
+        self._content = content
+        self._shared = False
+        self._message = None
+        self._table = None
+
+    @property
+    def expr(self):
+
+        # empty expression is created on first access
+        if self._expr is None:
+            self._expr = rosslt.Expression()
+        return self._expr
+
+    @expr.setter
+    def expr(self, expr):
+        self._expr = expr
+
+    @property
+    def content(self):
+
+        # materialize children of header view on first access
+        if self._table is not None:
+            table, index = self._table
+            self._table = None
+            self._content = table.content(index)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._table = None
+        self._content = content
+        self._shared = False
+
+    def _content_own(self):
+
+        # copy content shared with derived locations before modifying it
+        if self._shared:
+            self._content = dict(self._content)
+            self._shared = False
+        return self._content
 
     def __eq__(self, other):
         return self.node == other.node and self.id == other.id
@@ -48,18 +90,23 @@ class Location:
         return loc
 
     def has_state(self):
-        return self.id >= 0 or self.expr
+        return self.id >= 0 or bool(self._expr)
 
     def copy(self, expr=None, keep_id=True, keep_expr=True, keep_content=True):
-        return Location(self.node,
-                        self.id if keep_id else -1,
-                        self.expr + expr if keep_expr else None,
-                        dict(self.content) if keep_content and self.content else None)
+        location = Location(self.node,
+                            self.id if keep_id else -1,
+                            self.expr + expr if keep_expr else None)
+
+        # share content until one of both locations modifies it
+        if keep_content and (self._content or self._table) and self.content:
+            location._content = self._content
+            location._shared = self._shared = True
+        return location
 
     def clear(self):
 
         # clear expression and tracked reference
-        self.expr = rosslt.Expression()
+        self._expr = None
         self.ref = None
 
         # recursively clear tree
@@ -147,7 +194,7 @@ class Location:
 
         # add to content
         if self.content:
-            self.content[name] = location
+            self._content_own()[name] = location
         else:
             self.content = {name: location}
 
@@ -155,13 +202,13 @@ class Location:
 
         # delete if initialized
         if self.content:
-            del self.content[name]
+            del self._content_own()[name]
 
     def content_clear(self):
 
         # clear if initialized
         if self.content:
-            self.content.clear()
+            self._content_own().clear()
 
     def content_has(self, name):
 
@@ -191,57 +238,29 @@ class Location:
         # forward to content getter
         return self.content_get(name)
 
-    # header: rosslt_py_msgs.msg.LocationHeader
-    def header_write(self, header, parent=0, name=""):
-
-        # get next index
-        loc_index = len(header.locations)
-
-        # get node id
-        try:
-            node_id = header.locations.index(self.node)
-        except ValueError:
-            node_id = len(header.locations)
-            header.nodes.append(self.node)
-
-        # append location
-        header.locations.append(self.to_message(node_id, name))
-
-        # update graph
-        if loc_index:
-            header.graph.append(parent)
-            header.graph.append(loc_index)
-
-        # set new parent
-        parent = loc_index
-
-        # iterate content
-        if self.content:
-            for name, item in self.content.items():
-
-                # add content path and recurse
-                item.header_write(header, parent, name)
-
     #  -> rosslt_py_msgs.msg.LocationHeader
     def header_create(self):
 
-        # recursively fill with location tree
-        header = rosslt_py_msgs.msg.LocationHeader()
-        header.nodes.append(self.node)
-        self.header_write(header)
-
-        # header is done
-        return header
+        # flatten location tree into header arrays
+        return rosslt.LocationTable.from_location(self).to_header()
 
     def to_message(self, node, name):
 
+        # reuse message if location is unchanged
+        expr = self.expr.to_message()
+        cached = self._message
+        if cached is not None and cached.expr is expr and cached.id == self.id \
+                and cached.node == node and cached.name == name:
+            return cached
+
         # create message from location data
-        return rosslt_py_msgs.msg.Location(
+        self._message = rosslt_py_msgs.msg.Location(
             id=self.id,
             node=node,
             name=name,
-            expr=self.expr.to_message()
+            expr=expr
         )
+        return self._message
 
     # msg: rosslt_py_msgs.msg.Location
     @staticmethod
@@ -262,13 +281,5 @@ class Location:
         if not len(msg.locations):
             raise RuntimeError("no locations in header")
 
-        # create locations
-        locations = [Location.from_message(i, msg.nodes[i.node]) for i in msg.locations]
-        root = locations[0]
-
-        # build graph
-        for parent, child in zip(msg.graph[::2], msg.graph[1::2]):
-            locations[parent].content_add(msg.locations[child].name, locations[child])
-
-        # location is done
-        return root
+        # view into flat header arrays, children are created on access
+        return rosslt.location_table.header_cache.get(msg).location(0)
@@ -1,9 +1,11 @@
+import time
 import rosslt
 
 # optional dependencies
 try:
     import rosslt_py_msgs.msg
     import rosslt_py_msgs.srv
+    import std_msgs.msg
     import rclpy.qos
     import rclpy.node
     import rclpy.logging
@@ -22,6 +24,13 @@ class LocationManager:
         self.node = node
         self.locations = []
         self.location_map = {}
+        self.stream_encoders = {}
+        self.stream_decoders = {}
+        self.delta_encoders = {}
+        self.delta_decoders = {}
+        self.keyframe_requests = {}
+        self.reference_clients = {}
+        self.reference_requests = {}
 
         # settings
         qos_profile = rclpy.qos.qos_profile_services_default
@@ -42,11 +51,32 @@ class LocationManager:
             callback_group=callback_group
         )
 
+        # keyframe requests of stream subscribers
+        self.slt_keyframe_sub = node.create_subscription(
+            std_msgs.msg.String, "/slt_keyframe",
+            self.slt_keyframe,
+            qos_profile=qos_profile,
+            callback_group=callback_group
+        )
+        self.slt_keyframe_pub = node.create_publisher(
+            std_msgs.msg.String, "/slt_keyframe",
+            qos_profile=qos_profile,
+            callback_group=callback_group
+        )
+
         # service
         self.slt_get_srv = node.create_service(
             rosslt_py_msgs.srv.GetValue, node.get_name() + "/slt_get",
             self.slt_get
         )
+        self.slt_get_expression_srv = node.create_service(
+            rosslt_py_msgs.srv.GetExpression, node.get_name() + "/slt_get_expression",
+            self.slt_get_expression
+        )
+
+        # serve and resolve expression references of this node
+        rosslt.reference.node = node.get_name()
+        rosslt.reference.resolver = self.resolve_reference
 
     def add_location(self, location: rosslt.Location):
 
@@ -106,6 +136,69 @@ class LocationManager:
         res.valid = False
         return res
 
+    def slt_get_expression(self, req: "rosslt_py_msgs.srv.GetExpression.Request",
+                           res: "rosslt_py_msgs.srv.GetExpression.Response"):
+
+        # check for stored expression
+        msg = rosslt.reference.store.get((self.node.get_name(), req.digest))
+        if msg is not None:
+
+            # send expression
+            res.expr = msg
+            res.valid = True
+            return res
+
+        # unknown or dropped expression
+        res.valid = False
+        return res
+
+    def resolve_reference(self, reference):
+
+        # one pending request per reference, repeated after the timeout
+        key = (reference.node, reference.digest)
+        now = time.monotonic()
+        request_time, future = self.reference_requests.get(key, (None, None))
+        if request_time is not None and now - request_time < rosslt.config.reference_timeout:
+            return
+
+        # one client per remote node
+        client = self.reference_clients.get(reference.node)
+        if client is None:
+            client = self.reference_clients[reference.node] = self.node.create_client(
+                rosslt_py_msgs.srv.GetExpression, reference.node + "/slt_get_expression"
+            )
+
+        # drop unanswered request
+        if future is not None:
+            client.remove_pending_request(future)
+        self.reference_requests[key] = (now, None)
+
+        # check for available node
+        if not client.service_is_ready():
+            LOG.warn(f"expression service of {reference.node} not available")
+            return
+
+        # request stored expression, subscription callbacks are not blocked by the response
+        future = client.call_async(rosslt_py_msgs.srv.GetExpression.Request(
+            digest=reference.digest, location=reference.id))
+        future.add_done_callback(lambda f: self.slt_expression_response(reference, f))
+        self.reference_requests[key] = (now, future)
+
+    def slt_expression_response(self, reference, future):
+
+        # request completed
+        key = (reference.node, reference.digest)
+        self.reference_requests.pop(key, None)
+
+        # check response
+        res = future.result()
+        if res is None or not res.valid:
+            LOG.warn(f"expression {reference} not stored by {reference.node}")
+            return
+
+        # history is resolved on next evaluation
+        rosslt.reference.store.put(key, res.expr)
+
     def change_location(self, node_name, loc_id, new_value):
 
         # build message
@@ -119,3 +212,57 @@ class LocationManager:
             self.slt_set(msg)
         else:
             self.slt_set_pub.publish(msg)
+
+    # msg: std_msgs.msg.String
+    def slt_keyframe(self, msg):
+
+        # restart contexts of requested topic
+        if msg.data in self.stream_encoders:
+            self.stream_encoders[msg.data].request_keyframe()
+        if msg.data in self.delta_encoders:
+            self.delta_encoders[msg.data].request_keyframe()
+
+    @staticmethod
+    def _context(contexts, topic, context_type):
+
+        # one context per topic
+        if topic not in contexts:
+            contexts[topic] = context_type()
+        return contexts[topic]
+
+    def stream_encode(self, topic, header):
+
+        # send changed locations only
+        if rosslt.config.stream_delta:
+            header = self._context(self.delta_encoders, topic, rosslt.stream.DeltaEncoder).encode(header)
+
+        # compress with shared context
+        return self._context(self.stream_encoders, topic, rosslt.stream.StreamEncoder).encode(header)
+
+    def request_keyframe(self, topic):
+
+        # ask publisher of topic to restart its contexts
+        self.keyframe_requests[topic] = time.monotonic()
+        self.slt_keyframe_pub.publish(std_msgs.msg.String(data=topic))
+
+    def stream_decode(self, topic, header):
+
+        # undo compression, then patch delta into full header
+        for decoders, decoder_type in ((self.stream_decoders, rosslt.stream.StreamDecoder),
+                                       (self.delta_decoders, rosslt.stream.DeltaDecoder)):
+            decoder = self._context(decoders, topic, decoder_type)
+
+            # request keyframe when losing synchronization
+            synchronized = decoder.synchronized() or not decoder.dropped
+            header = decoder.decode(header)
+            if header is None:
+                if synchronized:
+                    LOG.info(f"stream {topic} out of sync, requesting keyframe")
+                    self.request_keyframe(topic)
+
+                # repeat request while out of sync in case it was lost
+                elif time.monotonic() - self.keyframe_requests.get(topic, 0.0) >= rosslt.config.stream_keyframe_retry:
+                    self.request_keyframe(topic)
+                return None
+
+        return header
@@ -0,0 +1,383 @@
+from collections import OrderedDict
+from itertools import chain
+import rosslt
+from .codec import ExpressionFragment, ExpressionMsgCompression, ExpressionMsgElement, encode, decode
+
+# optional dependencies
+try:
+    import rosslt_py_msgs.msg
+except ModuleNotFoundError:
+    pass
+
+
+# columns copied from header messages on first use
+_COLUMNS = ("name", "node", "id", "expr", "locations", "names", "_names")
+
+# shortest common prefix worth a fragment, in elements
+FRAGMENT_MIN = 4
+
+
+def _fragment_message(history):
+
+    # plain data array encoding
+    elements = bytearray()
+    data = bytearray()
+    encode(history, elements, data, rosslt.config.msg_dense)
+    return rosslt_py_msgs.msg.Expression(
+        elements=elements,
+        data=data,
+        compression=ExpressionMsgCompression.NONE,
+        elements_size=len(elements),
+        data_size=len(data))
+
+
+# header: rosslt_py_msgs.msg.LocationHeader
+def share_fragments(header):
+
+    # group locations with identical expression messages
+    fragments = []
+    replace = {}
+    identical = {}
+    for index, location in enumerate(header.locations):
+        expr = location.expr
+        if expr.elements_size or expr.data_size:
+            key = (expr.compression, bytes(expr.elements), bytes(expr.data))
+            identical.setdefault(key, []).append(index)
+
+    # group data array expressions by their first elements
+    prefixes = {}
+    for (compression, elements, data), indices in identical.items():
+        if compression == ExpressionMsgCompression.NONE:
+            history = decode(elements, data)
+            if len(history) >= FRAGMENT_MIN:
+                key = tuple((type(x), x) for x in history[:FRAGMENT_MIN])
+                prefixes.setdefault(key, []).append((indices, history))
+
+    # longest common prefix of each group becomes a fragment
+    for group in prefixes.values():
+        if len(group) < 2 and len(group[0][0]) < 2:
+            continue
+        length = min(len(history) for _, history in group)
+        first = group[0][1]
+        for _, history in group[1:]:
+            length = next((i for i in range(FRAGMENT_MIN, length)
+                           if type(history[i]) is not type(first[i]) or history[i] != first[i]), length)
+        for indices, history in group:
+            for index in indices:
+                replace[index] = [ExpressionFragment(len(fragments))] + history[length:]
+        fragments.append(_fragment_message(first[:length]))
+
+    # other identical expressions become a single reference
+    for (compression, elements, data), indices in identical.items():
+        if len(indices) > 1 and indices[0] not in replace and len(elements) + len(data) > 5:
+            for index in indices:
+                replace[index] = [ExpressionFragment(len(fragments))]
+            fragments.append(header.locations[indices[0]].expr)
+
+    # location messages may be shared, replace instead of modifying
+    for index, history in replace.items():
+        location = header.locations[index]
+        header.locations[index] = rosslt_py_msgs.msg.Location(
+            id=location.id,
+            node=location.node,
+            name=location.name,
+            expr=_fragment_message(history))
+    header.fragments = fragments
+    return header
+
+
+class LocationTable:
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def __init__(self, header=None):
+
+        # header tables read entries from location messages until columns are used
+        self._messages = None
+
+        # parallel arrays in header order, root location first
+        self.parent = []
+        self.nodes = []
+        self._nodes = {}
+
+        # child indices, built on demand
+        self._children = None
+
+        # decoded expressions of cached tables, handed out as views
+        self._shared = None
+
+        # expression parts shared between locations
+        self.fragments = []
+        self._fragments = {}
+
+        # index header graph
+        if header is not None:
+            self._messages = header.locations
+            self.fragments = list(header.fragments)
+            self.nodes = list(header.nodes)
+            self._nodes = {node: i for i, node in reversed(list(enumerate(self.nodes)))}
+
+            # parent index from graph pairs
+            self.parent = [-1] * len(self._messages)
+            for parent, child in zip(header.graph[::2], header.graph[1::2]):
+                self.parent[child] = parent
+            return
+
+        # remaining columns
+        self.name = []
+        self.node = []
+        self.id = []
+        self.expr = []
+
+        # source locations of each entry, if any
+        self.locations = []
+
+        # interned names
+        self.names = []
+        self._names = {}
+
+    def __getattr__(self, name):
+
+        # copy columns of header messages
+        if name in _COLUMNS and self._messages is not None:
+            self._load()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _load(self):
+
+        # columns of location messages
+        messages = self._messages
+        self.id = [x.id for x in messages]
+        self.node = [x.node for x in messages]
+        self.expr = [x.expr for x in messages]
+        self.locations = [None] * len(messages)
+        self.names = []
+        self._names = {}
+        self.name = [self._intern(self.names, self._names, x.name) for x in messages]
+        self._messages = None
+
+    def _intern(self, strings, table, value):
+
+        # index of string in table
+        index = table.get(value)
+        if index is None:
+            index = table[value] = len(strings)
+            strings.append(value)
+        return index
+
+    def append(self, parent, name, node, loc_id, expr, location=None):
+
+        # add entry and return its index
+        self.parent.append(parent)
+        self.name.append(self._intern(self.names, self._names, name))
+        self.node.append(self._intern(self.nodes, self._nodes, node))
+        self.id.append(loc_id)
+        self.expr.append(expr)
+        self.locations.append(location)
+        return len(self.id) - 1
+
+    def children(self):
+
+        # child indices per entry, indexed once
+        if self._children is None:
+            self._children = [[] for _ in self.parent]
+            for child, parent in enumerate(self.parent):
+                if parent >= 0:
+                    self._children[parent].append(child)
+        return self._children
+
+    def location(self, index):
+
+        # location entry from message or columns
+        messages = self._messages
+        if messages is not None:
+            msg = messages[index]
+            node, loc_id, expr = msg.node, msg.id, msg.expr
+        else:
+            node, loc_id, expr = self.node[index], self.id[index], self.expr[index]
+
+        # expression, shared between locations of cached tables
+        if self._shared is not None:
+            shared = self._shared.get(index)
+            if shared is None:
+                shared = self._shared[index] = self._expression(expr, loc_id)
+            expr = shared._view()
+        else:
+            expr = self._expression(expr, loc_id)
+
+        # children are created on first access
+        location = rosslt.Location(self.nodes[node], loc_id, expr)
+        if self.children()[index]:
+            location._table = (self, index)
+        return location
+
+    def _expression(self, expr, loc_id=-1):
+
+        # expression from message, decoding lazily without fragments
+        if type(expr) is rosslt.Expression:
+            return expr
+        fragments = self.fragments and expr.compression == ExpressionMsgCompression.NONE \
+            and ExpressionMsgElement.FRAGMENT in bytes(expr.elements)
+        expression = rosslt.Expression.from_message(expr)
+        if fragments:
+
+            # insert referenced fragments
+            history = []
+            for element in expression.elements():
+                if type(element) is ExpressionFragment:
+                    history.extend(self._fragment(element.index))
+                else:
+                    history.append(element)
+            expression = rosslt.Expression(history)
+
+        # resolve references and keep upstream history for own messages
+        if expr.compression & ExpressionMsgCompression.REFERENCES \
+                or rosslt.config.msg_references and rosslt.reference.node is not None:
+            return rosslt.reference.receive(expression, None if fragments else expr, loc_id)
+        return expression
+
+    def _fragment(self, index):
+
+        # decode each fragment once
+        fragment = self._fragments.get(index)
+        if fragment is None:
+            fragment = self._fragments[index] = list(rosslt.Expression.from_message(self.fragments[index]).elements())
+        return fragment
+
+    def content(self, index):
+
+        # child locations of entry by name
+        children = self.children()[index]
+        if not children:
+            return None
+        messages = self._messages
+        if messages is not None:
+            return {messages[child].name: self.location(child) for child in children}
+        names = self.names
+        return {names[self.name[child]]: self.location(child) for child in children}
+
+    @staticmethod
+    def from_location(root: "rosslt.Location"):
+
+        # flatten tree in pre-order without recursion
+        table = LocationTable()
+        intern = table._intern
+        stack = [(root, -1, "")]
+        while stack:
+            location, parent, name = stack.pop()
+            index = len(table.locations)
+            table.parent.append(parent)
+            table.name.append(intern(table.names, table._names, name))
+            table.node.append(intern(table.nodes, table._nodes, location.node))
+            table.id.append(location.id)
+            table.expr.append(location.expr)
+            table.locations.append(location)
+            if location.content:
+                stack.extend((item, index, name) for name, item in reversed(location.content.items()))
+
+        return table
+
+    # msg: rosslt_py_msgs.msg.LocationHeader
+    @staticmethod
+    def from_header(msg):
+
+        # index graph, entries stay in the message
+        return LocationTable(msg)
+
+    #  -> rosslt_py_msgs.msg.LocationHeader
+    def to_header(self):
+
+        # encode entries, reusing messages of source locations
+        names = self.names
+        locations = []
+        for index, location in enumerate(self.locations):
+            name = names[self.name[index]]
+            if location is not None:
+                locations.append(location.to_message(self.node[index], name))
+            else:
+                expr = self.expr[index]
+                locations.append(rosslt_py_msgs.msg.Location(
+                    id=self.id[index],
+                    node=self.node[index],
+                    name=name,
+                    expr=expr.to_message() if type(expr) is rosslt.Expression else expr))
+
+        # copy arrays into header
+        header = rosslt_py_msgs.msg.LocationHeader()
+        header.locations = locations
+        header.graph = list(chain.from_iterable((p, i) for i, p in enumerate(self.parent) if p >= 0))
+        header.nodes = list(self.nodes)
+
+        # share common expression parts, deltas compare complete expressions
+        if rosslt.config.header_fragments and not rosslt.config.stream_delta:
+            share_fragments(header)
+        return header
+
+    def to_location(self, index=0):
+
+        # create locations, decoding expressions lazily
+        nodes = self.nodes
+        locations = []
+        for node, loc_id, expr in zip(self.node, self.id, self.expr):
+            locations.append(rosslt.Location(nodes[node], loc_id, self._expression(expr, loc_id)))
+
+        # link children in header order
+        names = self.names
+        for child, parent in enumerate(self.parent):
+            if parent >= 0:
+                locations[parent].content_add(names[self.name[child]], locations[child])
+
+        return locations[index]
+
+
+class HeaderCache:
+
+    def __init__(self, size=None):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+
+    def clear(self):
+        self._tables.clear()
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    @staticmethod
+    def key(header):
+
+        # structure and packed expressions of all locations
+        return (tuple(header.nodes), tuple(header.graph),
+                tuple((x.id, x.node, x.name, x.expr.compression, bytes(x.expr.elements), bytes(x.expr.data))
+                      for x in header.locations),
+                tuple((x.compression, bytes(x.elements), bytes(x.data)) for x in header.fragments))
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def get(self, header):
+
+        # cache disabled
+        size = rosslt.config.header_cache if self.size is None else self.size
+        if not size:
+            return LocationTable(header)
+
+        # reuse table of identical header
+        key = self.key(header)
+        table = self._tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return table
+
+        # index new header, least recently used tables are dropped
+        self.misses += 1
+        table = self._tables[key] = LocationTable(header)
+        table._shared = {}
+        if len(self._tables) > size:
+            self._tables.popitem(last=False)
+        return table
+
+
+# static instance
+header_cache = HeaderCache()
@@ -77,3 +77,18 @@ class TrackingNode(Node):
     @staticmethod
     def publish(publisher, tracked: rosslt.Tracked):
         return publisher.publish(tracked.to_msg(publisher.msg_type))
+
+    def publish_stream(self, publisher, tracked: rosslt.Tracked):
+
+        # compress header with stream context of topic
+        msg = tracked.to_msg(publisher.msg_type)
+        msg.loc = self.loc_mgr.stream_encode(publisher.topic_name, msg.loc)
+        return publisher.publish(msg)
+
+    def receive_stream(self, topic, msg):
+
+        # decompress header with stream context of topic
+        msg.loc = self.loc_mgr.stream_decode(topic, msg.loc)
+        if msg.loc is None:
+            return None
+        return rosslt.Tracked.from_msg(msg)
@@ -1,6 +1,12 @@
 import math
 from functools import wraps
 
+# optional dependencies
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    pass
+
 
 # operator function wrapper
 def _fn_wrap(fn):
@@ -41,7 +47,12 @@ class Operator:
     LIST = None
     MAP = None
 
-    def __init__(self, code, content, commutative, arg_count, res_count, group=None, neutral=None, negate=False):
+    # fixed layout
+    __slots__ = ("code", "content", "commutative", "arg_count", "res_count", "reversed", "group", "neutral",
+                 "negate", "invertible", "fn", "source", "ufunc")
+
+    def __init__(self, code, content, commutative, arg_count, res_count, group=None, neutral=None, negate=False,
+                 invertible=True):
         self.code = code
         self.content = content
         self.commutative = commutative
@@ -51,7 +62,10 @@ class Operator:
         self.group = group
         self.neutral = neutral
         self.negate = negate
+        self.invertible = invertible
         self.fn = lambda _, stack: None
+        self.source = None
+        self.ufunc = None
 
     def __call__(self, stack):
         return self.fn(self, stack)
@@ -142,9 +156,10 @@ Operator.SUB = Operator(2, "-", commutative=False, arg_count=2, res_count=1, gro
 Operator.MUL_INT = Operator(3, "*", commutative=True, arg_count=2, res_count=1, group=0, neutral=1)
 Operator.MUL = Operator(4, "*", commutative=True, arg_count=2, res_count=1, group=2, neutral=1)
 Operator.DIV = Operator(5, "/", commutative=False, arg_count=2, res_count=1, group=2, neutral=1)
-Operator.DIV_FLOOR = Operator(6, "//", commutative=False, arg_count=2, res_count=1, group=0, neutral=1)
-Operator.SIN = Operator(7, "sin", commutative=True, arg_count=1, res_count=1, group=0)
-Operator.COS = Operator(8, "cos", commutative=True, arg_count=1, res_count=1, group=0)
+Operator.DIV_FLOOR = Operator(6, "//", commutative=False, arg_count=2, res_count=1, group=0, neutral=1,
+                              invertible=False)
+Operator.SIN = Operator(7, "sin", commutative=True, arg_count=1, res_count=1, group=0, invertible=False)
+Operator.COS = Operator(8, "cos", commutative=True, arg_count=1, res_count=1, group=0, invertible=False)
 Operator.ASIN = Operator(9, "asin", commutative=True, arg_count=1, res_count=1, group=0)
 Operator.ACOS = Operator(10, "acos", commutative=True, arg_count=1, res_count=1, group=0)
 Operator.POW = Operator(11, "pow", commutative=False, arg_count=2, res_count=1, group=0)
@@ -199,3 +214,44 @@ Operator.ASIN.fn = Operator.fn_asin
 Operator.ACOS.fn = Operator.fn_acos
 Operator.POW.fn = Operator.fn_pow
 Operator.IPOW.fn = Operator.fn_ipow
+
+# assign source templates
+# noinspection DuplicatedCode
+Operator.ADD.source = "{0} + {1}"
+Operator.SUB.source = "({0}[:len({0}) - len({1})] if type({0}) is str else {0} - {1})"
+Operator.MUL.source = "{0} * {1}"
+Operator.MUL_INT.source = "{0} * {1}"
+Operator.DIV.source = "({0}[:len({0}) // {1}] if type({0}) is str else {0} / {1})"
+Operator.DIV_FLOOR.source = "({0}[:len({0}) // {1}] if type({0}) is str else {0} // {1})"
+Operator.SIN.source = "math.sin({0})"
+Operator.COS.source = "math.cos({0})"
+Operator.ASIN.source = "math.asin({0})"
+Operator.ACOS.source = "math.acos({0})"
+Operator.POW.source = "{0} ** {1}"
+Operator.IPOW.source = "{0} ** (1 / {1})"
+
+
+# numpy power with python semantics for negative integer exponents
+def _np_power(a, b):
+    if np.issubdtype(np.result_type(a, b), np.integer) and np.any(np.less(b, 0)):
+        return np.float_power(a, b)
+    return np.power(a, b)
+
+
+# assign numpy functions
+# noinspection DuplicatedCode
+try:
+    Operator.ADD.ufunc = np.add
+    Operator.SUB.ufunc = np.subtract
+    Operator.MUL.ufunc = np.multiply
+    Operator.MUL_INT.ufunc = np.multiply
+    Operator.DIV.ufunc = np.true_divide
+    Operator.DIV_FLOOR.ufunc = np.floor_divide
+    Operator.SIN.ufunc = np.sin
+    Operator.COS.ufunc = np.cos
+    Operator.ASIN.ufunc = np.arcsin
+    Operator.ACOS.ufunc = np.arccos
+    Operator.POW.ufunc = _np_power
+    Operator.IPOW.ufunc = lambda a, b: _np_power(a, np.true_divide(1, b))
+except NameError:
+    pass
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from hashlib import blake2b
+import rosslt
+from .codec import ExpressionMsgCompression, ExpressionReference, encode
+from .expression import ExpressionChunk
+
+# optional dependencies
+try:
+    import rosslt_py_msgs.msg
+    from rclpy.logging import get_logger
+except ModuleNotFoundError:
+    from logging import getLogger as get_logger
+
+LOG = get_logger(__name__)
+
+# name of local node serving stored expressions, set by location manager
+node = None
+
+# callback requesting expression message of remote reference without waiting, set by location manager
+resolver = None
+
+
+class ReferenceCache:
+
+    def __init__(self, size=None):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def clear(self):
+        self._items.clear()
+
+    def get(self, key):
+
+        # count lookups and keep recently used items
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return item
+
+    def put(self, key, item):
+
+        # least recently used items are dropped
+        self._items[key] = item
+        self._items.move_to_end(key)
+        size = rosslt.config.reference_cache if self.size is None else self.size
+        while len(self._items) > size:
+            self._items.popitem(last=False)
+
+
+# expression messages served to other nodes and resolved remote histories
+store = ReferenceCache()
+cache = ReferenceCache()
+
+
+def digest(msg):
+
+    # content hash of expression message
+    h = blake2b(digest_size=8)
+    h.update(bytes(msg.elements))
+    h.update(bytes(msg.data))
+    return int.from_bytes(h.digest(), "little")
+
+
+def resolve(reference: ExpressionReference):
+
+    # resolved history of reference, None while unknown
+    key = (reference.node, reference.digest)
+    history = cache.get(key)
+    if history is not None:
+        return history
+
+    # stored locally or received from remote node, remote histories arrive asynchronously
+    msg = store.get(key)
+    if msg is None:
+        if resolver is not None:
+            resolver(reference)
+        return None
+    if digest(msg) != reference.digest:
+        LOG.warning(f"digest mismatch of {reference}")
+        return None
+
+    # references may be nested across several nodes
+    try:
+        history = tuple(expand(rosslt.Expression.from_message(msg).elements()))
+    except RuntimeError:
+        return None
+    cache.put(key, history)
+    return history
+
+
+def expand(elements):
+
+    # replace references by resolved histories
+    history = []
+    unresolved = []
+    for element in elements:
+        if type(element) is ExpressionReference:
+            resolved = resolve(element)
+            if resolved is None:
+                unresolved.append(element)
+            else:
+                history.extend(resolved)
+        else:
+            history.append(element)
+
+    # stores may have dropped the history or the response is still pending
+    if unresolved:
+        raise RuntimeError(f"unresolved expression references: {unresolved}")
+    return history
+
+
+class Upstream:
+
+    # expression received from upstream node, stored once referenced by a downstream message
+    __slots__ = ("msg", "id", "digest")
+
+    def __init__(self, msg, loc_id=-1):
+        self.msg = msg
+        self.id = loc_id
+        self.digest = None
+
+    def publish(self, items):
+
+        # encode history assembled from fragments
+        msg = self.msg
+        if msg is None:
+            elements = bytearray()
+            data = bytearray()
+            encode(items, elements, data, rosslt.config.msg_dense)
+            msg = self.msg = rosslt_py_msgs.msg.Expression(
+                elements=elements,
+                data=data,
+                compression=ExpressionMsgCompression.NONE,
+                elements_size=len(elements),
+                data_size=len(data))
+
+        # hash received bytes once, keep message in store while it is referenced
+        if self.digest is None:
+            self.digest = digest(msg)
+        store.put((node, self.digest), msg)
+        return ExpressionReference(node, self.id, self.digest)
+
+
+def receive(expr, msg=None, loc_id=-1):
+
+    # upstream history is stored when first referenced by a downstream message
+    upstream = Upstream(msg, loc_id) if rosslt.config.msg_references and node is not None else None
+
+    # messages without references are decoded on first change
+    if msg is not None and not msg.compression & ExpressionMsgCompression.REFERENCES:
+        if upstream is not None:
+            expr._cached()["upstream"] = upstream
+        return expr
+
+    # resolve known references, others are requested and kept until evaluation
+    history = list(expr.elements())
+    try:
+        history = expand(history)
+    except RuntimeError as e:
+        LOG.debug(str(e))
+
+    # own messages refer to upstream history while it is unchanged
+    expr = rosslt.Expression()
+    expr._base = ExpressionChunk(None, tuple(history), reference=upstream)
+    return expr
@@ -0,0 +1,127 @@
+from collections import Counter, namedtuple
+from time import perf_counter
+import rosslt
+
+# encoding and compression chosen for a single message
+Choice = namedtuple("Choice", ["msg_str", "level", "size"])
+
+
+class AdaptiveStrategy:
+
+    # candidate compression levels, None disables compression
+    LEVELS = (None, 1, 6, 9)
+
+    # retry the least recently used candidate every n messages
+    EXPLORE = 64
+
+    def __init__(self, smoothing=0.25):
+        self.smoothing = smoothing
+        self.messages = 0
+        self.choices = Counter()
+
+        # observations per (msg_str, level, size class)
+        self.ratio = {}
+        self.rate = {}
+        self.seen = {}
+
+    def reset(self):
+        self.__init__(self.smoothing)
+
+    @staticmethod
+    def estimate(expr):
+
+        # count operand mix in single pass
+        operators = rosslt.Operator
+        dense = rosslt.config.msg_dense
+        size_str = size_data = 0
+        fusable = False
+        for element in expr.elements():
+            element_type = type(element)
+            if element_type is operators:
+                size_str += len(element.content) + 1
+                size_data += 0 if dense and fusable else 1
+                fusable = False
+            elif element_type is int:
+                bits = element.bit_length()
+                size_str += (bits * 3 + 9) // 10 + 2
+                if dense:
+                    size_data += 2 if bits < 8 else 3 if bits < 16 else 5 if bits < 32 else 9 if bits < 64 else bits // 7 + 2
+                else:
+                    size_data += 5 if bits < 32 else 9
+                fusable = True
+            elif element_type is float:
+                size_str += 20
+                size_data += 9
+                fusable = True
+            elif element_type is complex:
+                size_str += 42
+                size_data += 17
+                fusable = False
+            elif element_type is str:
+                size_str += len(element) + 3
+                size_data += len(element) + 5
+                fusable = False
+            else:
+                size_str += 5
+                fusable = False
+
+        return size_str, size_data
+
+    def choose(self, expr):
+
+        # pick smaller encoding
+        size_str, size_data = self.estimate(expr)
+        msg_str = size_str < size_data
+        size = min(size_str, size_data)
+
+        # observations depend on message size
+        size_class = size.bit_length()
+        keys = [(msg_str, level, size_class) for level in self.LEVELS]
+
+        # try unknown candidates first, then periodically revisit the oldest
+        for key in keys:
+            if key not in self.ratio:
+                return Choice(msg_str, key[1], size)
+        if self.messages % self.EXPLORE == self.EXPLORE - 1:
+            key = min(keys, key=self.seen.__getitem__)
+            return Choice(msg_str, key[1], size)
+
+        # smallest expected result within cpu budget for compression
+        budget = rosslt.config.msg_adaptive_budget + self.rate[keys[0]] * size
+        best = keys[0]
+        for key in keys[1:]:
+            if self.rate[key] * size <= budget and self.ratio[key] < self.ratio[best]:
+                best = key
+        return Choice(msg_str, best[1], size)
+
+    def observe(self, choice, raw_size, size, elapsed):
+
+        # exponential moving average of ratio and time per byte
+        key = (choice.msg_str, choice.level, choice.size.bit_length())
+        ratio = size / max(raw_size, 1)
+        rate = elapsed / max(raw_size, 1)
+        if key in self.ratio:
+            self.ratio[key] += self.smoothing * (ratio - self.ratio[key])
+            self.rate[key] += self.smoothing * (rate - self.rate[key])
+        else:
+            self.ratio[key] = ratio
+            self.rate[key] = rate
+        self.seen[key] = self.messages
+
+        # record decision
+        self.choices[choice.msg_str, choice.level] += 1
+        self.messages += 1
+
+    def to_message(self, expr):
+
+        # encode with chosen strategy and measure result
+        choice = self.choose(expr)
+        start = perf_counter()
+        msg = expr._encode_message(choice.msg_str, choice.level, 0)
+        elapsed = perf_counter() - start
+        self.observe(choice, msg.elements_size + msg.data_size, len(msg.elements) + len(msg.data), elapsed)
+        return msg, choice
+
+
+# static instance
+adaptive = AdaptiveStrategy()
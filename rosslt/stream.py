@@ -0,0 +1,251 @@
+import zlib
+import rosslt
+from .codec import ExpressionMsgCompression, LocationHeaderFlag
+
+# optional dependencies
+try:
+    import rosslt_py_msgs.msg
+except ModuleNotFoundError:
+    pass
+
+# trailer of every sync flush, implied on the wire
+SYNC_TRAILER = b"\x00\x00\xff\xff"
+
+
+class StreamEncoder:
+
+    def __init__(self, level=None, keyframe=None):
+        self.level = rosslt.config.stream_level if level is None else level
+        self.keyframe = rosslt.config.stream_keyframe if keyframe is None else keyframe
+        self.seq = 0
+        self._compressor = None
+
+    def request_keyframe(self):
+
+        # restart stream context with next message
+        self._compressor = None
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def encode(self, header):
+
+        # restart context periodically so late joiners can synchronize
+        flags = LocationHeaderFlag.STREAM
+        if self._compressor is None or (self.keyframe and self.seq % self.keyframe == 0):
+            self._compressor = zlib.compressobj(self.level)
+            flags |= LocationHeaderFlag.KEYFRAME
+        compressor = self._compressor
+
+        # compress uncompressed expressions with shared context
+        for index, location in enumerate(header.locations):
+            expr = location.expr
+            codec = expr.compression & ~ExpressionMsgCompression.STRING & ~ExpressionMsgCompression.REFERENCES
+            if codec or not (expr.elements_size or expr.data_size):
+                continue
+            chunk = compressor.compress(bytes(expr.elements) + bytes(expr.data))
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+
+            # location messages may be shared, replace instead of modifying
+            header.locations[index] = rosslt_py_msgs.msg.Location(
+                id=location.id,
+                node=location.node,
+                name=location.name,
+                expr=rosslt_py_msgs.msg.Expression(
+                    elements=b"",
+                    data=chunk[:-len(SYNC_TRAILER)],
+                    compression=expr.compression | ExpressionMsgCompression.STREAM,
+                    elements_size=expr.elements_size,
+                    data_size=expr.data_size))
+
+        # sequence number detects dropped messages
+        header.seq = self.seq
+        header.flags |= flags
+        self.seq = (self.seq + 1) & 0xffffffff
+        return header
+
+
+class StreamDecoder:
+
+    def __init__(self):
+        self.seq = None
+        self.dropped = 0
+        self._decompressor = None
+
+    def synchronized(self):
+        return self._decompressor is not None
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def decode(self, header):
+
+        # pass headers without stream context
+        if not header.flags & LocationHeaderFlag.STREAM:
+            return header
+
+        # keyframes restart the context, other messages must follow directly
+        if header.flags & LocationHeaderFlag.KEYFRAME:
+            self._decompressor = zlib.decompressobj()
+        elif self._decompressor is None or header.seq != (self.seq + 1) & 0xffffffff:
+            self._decompressor = None
+            self.dropped += 1
+            return None
+        self.seq = header.seq
+
+        # decompress in stream order
+        try:
+            for location in header.locations:
+                expr = location.expr
+                if expr.compression & ExpressionMsgCompression.STREAM:
+                    raw = self._decompressor.decompress(bytes(expr.data) + SYNC_TRAILER)
+                    expr.elements = raw[:expr.elements_size]
+                    expr.data = raw[expr.elements_size:]
+                    expr.compression &= ~ExpressionMsgCompression.STREAM
+        except zlib.error:
+            self._decompressor = None
+            self.dropped += 1
+            return None
+
+        # header is usable without stream context
+        header.flags &= ~LocationHeaderFlag.STREAM
+        return header
+
+
+# node index marking removed locations in delta headers
+DELTA_REMOVED = 0xffff
+
+
+def _path_name(path):
+
+    # escaped names prefixed by separator, root location has empty name
+    return "".join("/" + name.replace("%", "%25").replace("/", "%2F") for name in path)
+
+
+def _name_path(name):
+
+    # path tuple from delta location name
+    return tuple(x.replace("%2F", "/").replace("%25", "%") for x in name.split("/")[1:])
+
+
+def _header_state(header):
+
+    # location paths from graph, root location has empty path
+    paths = [()] * len(header.locations)
+    for parent, child in zip(header.graph[::2], header.graph[1::2]):
+        paths[child] = paths[parent] + (header.locations[child].name,)
+
+    # location entries by path in header order
+    return {path: (loc.id, header.nodes[loc.node], loc.expr) for path, loc in zip(paths, header.locations)}
+
+
+def _state_header(state, header):
+
+    # rebuild full header from location entries
+    result = rosslt_py_msgs.msg.LocationHeader(seq=header.seq, base=header.base,
+                                               flags=header.flags & ~LocationHeaderFlag.DELTA)
+    index = {}
+    nodes = {}
+    for path, (loc_id, node, expr) in state.items():
+
+        # link to parent, skipping orphans of removed locations
+        parent, name = path[:-1], path[-1] if path else ""
+        if path:
+            if parent not in index:
+                continue
+            result.graph.extend((index[parent], len(result.locations)))
+
+        # append location
+        index[path] = len(result.locations)
+        result.locations.append(rosslt_py_msgs.msg.Location(
+            id=loc_id,
+            node=nodes.setdefault(node, len(nodes)),
+            name=name,
+            expr=expr))
+
+    result.nodes = list(nodes)
+    return result
+
+
+class DeltaEncoder:
+
+    def __init__(self, keyframe=None):
+        self.keyframe = rosslt.config.delta_keyframe if keyframe is None else keyframe
+        self.base = 0
+        self._count = 0
+        self._state = None
+
+    def request_keyframe(self):
+
+        # send full header with next message
+        self._state = None
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def encode(self, header):
+
+        # full header becomes new base periodically
+        state = _header_state(header)
+        if self._state is None or (self.keyframe and self._count >= self.keyframe):
+            self._state = state
+            self._count = 0
+            self.base = (self.base + 1) & 0xffffffff
+            header.base = self.base
+            header.flags |= LocationHeaderFlag.DELTA_KEYFRAME
+            return header
+        self._count += 1
+
+        # locations changed relative to base, named by escaped path
+        delta = rosslt_py_msgs.msg.LocationHeader(base=self.base, flags=header.flags | LocationHeaderFlag.DELTA)
+        nodes = {}
+        for path, entry in state.items():
+            if self._state.get(path) != entry:
+                delta.locations.append(rosslt_py_msgs.msg.Location(
+                    id=entry[0],
+                    node=nodes.setdefault(entry[1], len(nodes)),
+                    name=_path_name(path),
+                    expr=entry[2]))
+
+        # locations removed since base
+        for path in self._state:
+            if path not in state:
+                delta.locations.append(rosslt_py_msgs.msg.Location(id=-1, node=DELTA_REMOVED, name=_path_name(path)))
+
+        delta.nodes = list(nodes)
+        return delta
+
+
+class DeltaDecoder:
+
+    def __init__(self):
+        self.base = None
+        self.dropped = 0
+        self._state = None
+
+    def synchronized(self):
+        return self._state is not None
+
+    # header: rosslt_py_msgs.msg.LocationHeader
+    def decode(self, header):
+
+        # remember full header as base
+        if header.flags & LocationHeaderFlag.DELTA_KEYFRAME:
+            self._state = _header_state(header)
+            self.base = header.base
+            return header
+
+        # pass headers without delta
+        if not header.flags & LocationHeaderFlag.DELTA:
+            return header
+
+        # deltas only depend on their base
+        if self._state is None or header.base != self.base:
+            self.dropped += 1
+            return None
+
+        # patch copy of base
+        state = dict(self._state)
+        for location in header.locations:
+            path = _name_path(location.name)
+            if location.node == DELTA_REMOVED:
+                state.pop(path, None)
+            else:
+                state[path] = (location.id, header.nodes[location.node], location.expr)
+
+        # full header for location tree
+        return _state_header(state, header)
@@ -2,6 +2,7 @@ import copy
 import math
 import rosslt
 from rosslt import Location
+from .operators import Operator
 
 # optional dependencies
 try:
@@ -12,13 +13,30 @@ except ModuleNotFoundError:
 
 class Tracked:
 
+    # compact layout, other attributes are forwarded to data
+    __slots__ = ("_data", "_loc", "_location_mgr", "_parent", "_name", "_reads")
+
+    def __new__(cls, data=None, *args, **kwargs):
+
+        # numeric scalars use specialized operators, messages generated proxies
+        if cls is Tracked:
+            data_type = type(data)
+            cls = _SCALARS.get(data_type) or _PROXIES.get(data_type) or _proxy(data_type)
+        return object.__new__(cls)
+
     def __init__(self, data, location=None,
                  location_mgr: "rosslt.LocationManager" = None):
 
         self._data = data
         self._location_mgr = location_mgr
 
-        # check for supplied location
+        # parent and name of values read from a tracked container
+        self._parent = None
+        self._name = None
+        self._reads = None
+
+        # check for supplied location, otherwise it is created on first use
+        self._loc = None
         if location:
 
             # parse header
@@ -28,16 +46,22 @@ class Tracked:
             except NameError:
                 pass
 
-            # apply map
-            self._location = location
+            # apply map and update location reference
+            self._loc = location
+            location.ref = self
 
-        else:
+    @property
+    def _location(self):
 
-            # create new location and map
-            self._location = Location()
+        # location of unmodified values is created on access
+        location = self._loc
+        if location is None:
+            location = self._materialize()
+        return location
 
-        # update location reference
-        self._location.ref = self
+    @_location.setter
+    def _location(self, location):
+        self._loc = location
 
     # Interface
 
@@ -119,7 +143,44 @@ class Tracked:
 
     @staticmethod
     def _unpack(other: "Tracked"):
-        return other._data if type(other) is Tracked else other
+        return other._data if isinstance(other, Tracked) else other
+
+    def _materialize(self):
+
+        # create location of value that was only read so far
+        parent = self._parent
+        if parent is None:
+            location = Location()
+        else:
+            name = self._name
+            self._parent = self._name = None
+
+            # value may have been read more than once, locations of other values are replaced
+            location = None
+            if parent._location.content_has(name):
+                location = parent._location.content_get(name)
+                if location.ref is not None and location.ref is not self:
+                    location = None
+            if location is None:
+                location = parent._create_location(name)
+
+        # update location reference
+        self._loc = location
+        location.ref = self
+        return location
+
+    def _read(self, value, name):
+
+        # defer location until value is modified
+        tracked = Tracked(value, None, self._location_mgr)
+        tracked._parent = self
+        tracked._name = name
+
+        # remember values that can not be stored as tracked in data
+        if self._reads is None:
+            self._reads = {}
+        self._reads[name] = tracked
+        return tracked
 
     def _create_location(self, name):
 
@@ -204,11 +265,14 @@ class Tracked:
         value = self._data[item]
         # TODO: getitem/setitem sync with getattr/setattr
 
-        # convert to tracked
+        # convert to tracked, location is created on modification
         if not isinstance(value, Tracked):
-            value = Tracked(value,
-                            self._create_location(item),
-                            self._location_mgr)
+
+            # reuse value of previous read while item is unchanged
+            read = self._reads.get(item) if self._reads else None
+            if read is not None and read._data is value:
+                return read
+            value = self._read(value, item)
 
         # done
         return value
@@ -406,21 +470,24 @@ class Tracked:
         value = getattr(self._data, item)
 
         # convert to tracked
-        if type(value) is not Tracked:
+        if not isinstance(value, Tracked):
 
             # check location for tracked reference
-            location = None
-            if self._location.content_has(item):
-                location = self._location.content_get(item)
+            location = self._loc
+            if location is not None and location.content_has(item):
+                location = location.content_get(item)
                 if location.ref is not None:
                     return location.ref
+                value = Tracked(value, location, self._location_mgr)
 
-            # create new location if necessary
-            if not location:
-                location = self._create_location(item)
+            # location is created on modification, reuse value of previous read
+            else:
+                read = self._reads.get(item) if self._reads else None
+                if read is not None and read._data is value:
+                    return read
+                value = self._read(value, item)
 
             # try to set as tracked
-            value = Tracked(value, location, self._location_mgr)
             try:
                 # set value
                 setattr(self._data, item, value)
@@ -435,11 +502,11 @@ class Tracked:
     def __setattr__(self, key, value):
 
         # required for constructor
-        if key in ("_data", "_location", "_location_mgr"):
+        if key in ("_data", "_loc", "_location", "_location_mgr", "_parent", "_name", "_reads"):
             return super().__setattr__(key, value)
 
         # check if already tracked
-        is_tracked = type(value) is Tracked
+        is_tracked = isinstance(value, Tracked)
         new_tracked = None
 
         # guard against type assertions
@@ -498,3 +565,217 @@ class Tracked:
     @staticmethod
     def from_msg(msg):
         return Tracked(msg.data, msg.loc)
+
+
+class _TrackedScalar(Tracked):
+
+    # scalars have no attributes to forward
+    __slots__ = ()
+    __setattr__ = object.__setattr__
+
+    def _build(self, data_new, param):
+
+        # copy location of source value
+        location = self._loc
+        if location is None:
+            location = self._materialize()
+        location = location.copy(param)
+
+        # construct result without generic initialization
+        scalar = _SCALARS.get(type(data_new))
+        if scalar is None:
+            return Tracked(data_new, location)
+        tracked = object.__new__(scalar)
+        tracked._data = data_new
+        tracked._loc = location
+        tracked._location_mgr = None
+        tracked._parent = tracked._name = tracked._reads = None
+        location.ref = tracked
+        return tracked
+
+    def _update(self, data_new, param):
+
+        # set value and append to expression
+        self._data = data_new
+        location = self._loc
+        if location is None:
+            location = self._materialize()
+        location.expr += param
+
+        # division of integers changes the operand type
+        if type(data_new) is not self._type:
+            self.__class__ = _SCALARS.get(type(data_new), Tracked)
+        return self
+
+    # Operators
+
+    def __add__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(self._data + other, (other, Operator.ADD))
+
+    def __radd__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(other + self._data, (other, Operator.SWAP, Operator.ADD))
+
+    def __iadd__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._update(self._data + other, (other, Operator.ADD))
+
+    def __sub__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(self._data - other, (other, Operator.SUB))
+
+    def __rsub__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(other - self._data, (other, Operator.SWAP, Operator.SUB))
+
+    def __isub__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._update(self._data - other, (other, Operator.SUB))
+
+    def __mul__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(self._data * other, (other, self._mul_operator(other)))
+
+    def __rmul__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(other * self._data, (other, Operator.SWAP, self._mul_operator(other)))
+
+    def __imul__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._update(self._data * other, (other, self._mul_operator(other)))
+
+    def __truediv__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(self._data / other, (other, Operator.DIV))
+
+    def __rtruediv__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._build(other / self._data, (other, Operator.SWAP, Operator.DIV))
+
+    def __itruediv__(self, other):
+        if type(other) is not float and type(other) is not int:
+            other = self._unpack(other)
+        return self._update(self._data / other, (other, Operator.DIV))
+
+
+class TrackedFloat(_TrackedScalar):
+
+    __slots__ = ()
+    _type = float
+
+    @staticmethod
+    def _mul_operator(other):
+        return Operator.MUL
+
+
+class TrackedInt(_TrackedScalar):
+
+    __slots__ = ()
+    _type = int
+
+    @staticmethod
+    def _mul_operator(other):
+
+        # check for integer multiplication
+        return Operator.MUL_INT if type(other) is int else Operator.MUL
+
+
+# specialized classes per data type
+_SCALARS = {
+    float: TrackedFloat,
+    int: TrackedInt,
+}
+
+
+def _field_get(name):
+
+    def getter(self):
+
+        # rosidl messages can not hold tracked values
+        value = getattr(self._data, name)
+        if isinstance(value, Tracked):
+            return value
+
+        # check location for tracked reference
+        location = self._loc
+        content = location.content if location is not None else None
+        location = content.get(name) if content else None
+        if location is not None:
+            if location.ref is not None:
+                return location.ref
+            return Tracked(value, location, self._location_mgr)
+
+        # location is created on modification, reuse value of previous read
+        read = self._reads.get(name) if self._reads else None
+        if read is not None and read._data is value:
+            return read
+        return self._read(value, name)
+
+    return getter
+
+
+def _field_set(name):
+
+    def setter(self, value):
+
+        # store data, location keeps expression of tracked value
+        location = self._location
+        if isinstance(value, Tracked):
+            setattr(self._data, name, value._data)
+            location.content_add(name, value._location)
+            return
+
+        # check for existing location
+        if location.content_has(name):
+            location = location.content_get(name)
+        else:
+            location = self._create_location(name)
+
+        # apply type correct force value instead
+        if location.force is not None and type(location.force) is not str:
+            value = location.force
+
+        # update tracked reference of location
+        Tracked(value, location, self._location_mgr)
+        setattr(self._data, name, value)
+
+    return setter
+
+
+def _proxy(data_type):
+
+    # only rosidl messages describe their fields
+    fields = getattr(data_type, "_fields_and_field_types", None)
+    if fields is None:
+        _PROXIES[data_type] = Tracked
+        return Tracked
+
+    # property per field, names of tracked methods keep their meaning
+    namespace = {"__slots__": (), "_fields": dict(fields)}
+    for name in fields:
+        if not hasattr(Tracked, name):
+            namespace[name] = property(_field_get(name), _field_set(name))
+
+    # fields are assigned through properties without forwarding
+    if len(namespace) == len(fields) + 2:
+        namespace["__setattr__"] = object.__setattr__
+
+    # generate once per message type
+    proxy = _PROXIES[data_type] = type(f"Tracked{data_type.__name__}", (Tracked,), namespace)
+    return proxy
+
+
+# generated classes per message type
+_PROXIES = {}
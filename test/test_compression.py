@@ -0,0 +1,93 @@
+import unittest
+import random
+from rosslt import Tracked, Location, apply_random, codec, compression, stream
+
+
+class TestCompression(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rng = random.Random()
+
+    def _sample(self):
+
+        # encode random expression
+        val = Tracked(self.rng.randint(0, 100))
+        for _ in range(self.rng.randint(10, 50)):
+            val = apply_random(val, self.rng, self.rng.randint(1, 9), False)
+        elements, data = bytearray(), bytearray()
+        codec.encode(val.get_expression().elements(), elements, data)
+        return bytes(elements) + bytes(data)
+
+    def test_codecs(self):
+
+        # compress and decompress with every codec
+        sample = self._sample()
+        for name in ("none", "zlib", "lzma", "bz2"):
+            c = compression.get(name)
+            self.assertIs(compression.get(c.code), c)
+            self.assertEqual(c.decompress(c.compress(sample, 6), len(sample)), sample)
+
+        # unknown codec
+        with self.assertRaises(ValueError):
+            compression.get("unknown")
+
+    def test_dictionary(self):
+
+        # train dictionary from recorded expressions
+        zdict = compression.train_dictionary(self._sample() for _ in range(100))
+        self.assertTrue(0 < len(zdict) <= 4096)
+        previous = compression._dictionary
+        try:
+            compression.add_dictionary(zdict)
+
+            # preset dictionary improves compression of small messages
+            c = compression.get("zlib_dict")
+            sample = self._sample()
+            compressed = c.compress(sample, 6)
+            self.assertLess(len(compressed), len(compression.get("zlib").compress(sample, 6)))
+
+            # dictionary is found by checksum
+            compression.add_dictionary(b"other dictionary")
+            self.assertEqual(c.decompress(compressed, len(sample)), sample)
+
+        finally:
+            # restore active dictionary for other tests
+            compression._dictionary = previous
+
+    def test_stream(self):
+
+        # tracked value with nested locations
+        val = Tracked(self.rng.randint(0, 100))
+        val = apply_random(val, self.rng, self.rng.randint(1, 9), False)
+        encoder = stream.StreamEncoder(keyframe=10)
+        decoder = stream.StreamDecoder()
+        late = stream.StreamDecoder()
+        size = size_stream = 0
+        for n in range(30):
+            val = apply_random(val, self.rng, self.rng.randint(1, 9), False)
+            size += sum(len(x.expr.data) for x in val.get_location().header_create().locations)
+            header = encoder.encode(val.get_location().header_create())
+            size_stream += sum(len(x.expr.data) for x in header.locations)
+
+            # drop one message
+            if n == 3:
+                continue
+
+            # decoder synchronizes again with next keyframe
+            decoded = decoder.decode(header)
+            self.assertEqual(decoded is None, 3 < n < 10)
+            if decoded is not None:
+                self.assertEqual(str(Location.from_header(decoded).expr), str(val.get_expression()))
+
+            # late joiner starts with next keyframe
+            if n >= 5:
+                self.assertEqual(late.decode(header) is None, n < 10)
+
+        # stream context removes repeated content
+        self.assertEqual(decoder.dropped, 6)
+        self.assertLess(size_stream, size / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,47 @@ class TestContainer(unittest.TestCase):
                 self.assertEqual(x, val[i])
                 i += 1
 
+    def test_read(self):
+
+        # modified list item is not shared with later reads
+        val = Tracked([1.0, 2.0])
+        a = val[0]
+        self.assertIs(val[0], a)
+        a += 1.0
+        b = val[0]
+        b *= 3.0
+        self.assertEqual(str(a.get_expression()), "1.0;+")
+        self.assertEqual(str(b.get_expression()), "3.0;*")
+        self.assertEqual(a.get_original(), 1.0)
+        self.assertEqual(b.get_original(), 1.0)
+
+        # same for dictionary items
+        val = Tracked({"k": 1.0})
+        a = val["k"]
+        a += 5
+        b = val["k"]
+        b -= 1
+        self.assertEqual(str(b.get_expression()), "1;-")
+        self.assertEqual(b.get_original(), 1.0)
+        self.assertEqual(a.get_original(), 1.0)
+
+    def test_derived(self):
+
+        # derived list shares child locations with original
+        val = Tracked([])
+        for i in range(10):
+            val.append(float(i))
+        derived = val + [10.0]
+        location = val.get_location()
+        self.assertIs(derived.get_location().content, location.content)
+
+        # modifying either copies the content first
+        derived.append(11.0)
+        val.pop()
+        self.assertEqual(len(location.content), 9)
+        self.assertEqual(len(derived.get_location().content), 11)
+        self.assertIs(derived.get_location().content_get("0"), location.content_get("0"))
+
     def test_dict(self):
 
         # run n times
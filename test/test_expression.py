@@ -1,6 +1,16 @@
 import unittest
+import math
 import random
-from rosslt import Tracked
+from struct import pack
+
+import rosslt
+from rosslt import Tracked, apply_random, codec
+
+# optional dependencies
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
 
 
 class TestExpression(unittest.TestCase):
@@ -126,6 +136,261 @@ class TestExpression(unittest.TestCase):
             val_expression = val_cur.get_expression()(val_start)
             self.assertAlmostEqual(val_expression, val_cur, 1)
 
+    def test_sharing(self):
+
+        # run n times
+        for n in range(self.iterations // 10):
+
+            # build long history and keep intermediate values
+            val_start = self.rng.random()
+            values = [Tracked(val_start)]
+            for _ in range(self.rng.randint(1, 200)):
+                values.append(apply_random(values[-1], self.rng, self.rng.random()))
+
+            # derive branches from shared intermediate values
+            branches = []
+            for val in self.rng.sample(values, min(len(values), 8)):
+                branches.append(apply_random(val, self.rng, self.rng.random()))
+                branches[-1] += self.rng.random()
+
+            # assert all expressions are unaffected by each other
+            for val in values + branches:
+                expression = val.get_expression()
+                self.assertAlmostEqual(expression(val_start), val, 1)
+                self.assertAlmostEqual(expression.reverse()(val), val_start, 1)
+                self.assertEqual(len(expression), len(list(expression.elements())))
+
+    @staticmethod
+    def _evaluate(expression, value):
+
+        # compare results and errors by representation
+        try:
+            return repr(expression(value))
+        except (ArithmeticError, ValueError, TypeError) as e:
+            return repr(type(e))
+
+    def test_compile(self):
+
+        # run n times
+        for n in range(self.iterations // 10):
+
+            # build expression with swaps and powers
+            val_start = self.rng.random()
+            val_cur = Tracked(val_start)
+            for _ in range(self.rng.randint(0, 100)):
+                choice = self.rng.randint(1, 4)
+                if choice == 1:
+                    val_cur = apply_random(val_cur, self.rng, self.rng.random())
+                elif choice == 2:
+                    val_cur = self.rng.random() - val_cur
+                elif choice == 3:
+                    val_cur = (self.rng.random() + 1) / val_cur
+                elif choice == 4:
+                    val_cur = val_cur.sin() ** 2 + 1
+
+            # assert compiled function matches interpreter
+            for expression in (val_cur.get_expression(), val_cur.get_expression().reverse()):
+                value = self._evaluate(expression, val_start)
+                expression.compile()
+                self.assertEqual(self._evaluate(expression, val_start), value)
+
+        # compile string expression
+        val = 3 * (Tracked("test") + "string")
+        self.assertEqual(val.get_expression().reverse().compile()(val._data), "test")
+
+        # long histories are only compiled explicitly
+        expression = rosslt.Expression([1.0, rosslt.Operator.ADD] * rosslt.config.expr_compile_max)
+        for _ in range(rosslt.config.expr_compile + 1):
+            self.assertEqual(expression(0.0), rosslt.config.expr_compile_max)
+        self.assertNotIn(1, expression._cache)
+
+    def test_reverse_cache(self):
+
+        # build value with history
+        val_start = self.rng.randint(0, 100)
+        val_cur = Tracked(val_start)
+        for _ in range(self.rng.randint(1, 100)):
+            val_cur = apply_random(val_cur, self.rng, self.rng.randint(1, 9), False)
+
+        # modify returned reverse expression
+        backwards = val_cur.get_expression().reverse()
+        backwards += (5, rosslt.Operator.ADD)
+        self.assertEqual(backwards(val_cur), val_start + 5)
+
+        # assert cached reverse is unaffected
+        for _ in range(self.iterations):
+            self.assertEqual(val_cur.get_original(), val_start)
+
+        # assert reverse follows history changes
+        val_cur += 7
+        self.assertEqual(val_cur.get_original(), val_start)
+
+        # assert returned history is a copy
+        val_cur.get_expression().history().clear()
+        self.assertEqual(val_cur.get_original(), val_start)
+
+    def test_affine(self):
+
+        # enable affine normal form
+        rosslt.config.expr_affine = True
+        try:
+
+            # run n times
+            for n in range(self.iterations // 10):
+
+                # apply random affine operations
+                val_start = self.rng.random()
+                val_cur = Tracked(val_start)
+                for _ in range(self.rng.randint(1, 100)):
+                    val_cur = apply_random(val_cur, self.rng, self.rng.random())
+                    if self.rng.random() < 0.2:
+                        val_cur = self.rng.random() - val_cur
+
+                # assert constant size and reverse
+                self.assertLessEqual(len(val_cur.get_expression()), 4)
+                self.assertAlmostEqual(val_cur.get_original(), val_start, 6)
+
+                # non affine operator starts new affine part
+                val_cur = val_cur.sin() * 2.0 + 1.0
+                val_cur = 3.0 - val_cur / 4.0
+                self.assertLessEqual(len(val_cur.get_expression()), 9)
+                self.assertAlmostEqual(val_cur.get_expression()(val_start), val_cur, 6)
+
+        finally:
+            rosslt.config.expr_affine = False
+
+    def test_compact(self):
+
+        # run n times
+        for n in range(self.iterations // 10):
+
+            # build history
+            val_start = self.rng.random()
+            val_cur = Tracked(val_start)
+            for _ in range(self.rng.randint(0, 100)):
+                val_cur = apply_random(val_cur, self.rng, self.rng.choice((
+                    self.rng.randint(1, 9), self.rng.random())))
+
+            # compact expression
+            expression = val_cur.get_expression()
+            expression_str = str(expression)
+            value = expression(val_start)
+            original = val_cur.get_original()
+            expression.compact()
+            self.assertTrue(expression.packed())
+
+            # assert compact expression behaves identically
+            self.assertEqual(str(expression), expression_str)
+            self.assertEqual(len(expression), len(expression_str.split(";")) if expression_str else 0)
+            self.assertEqual(expression(val_start), value)
+            self.assertEqual(val_cur.get_original(), original)
+
+            # modification unpacks expression
+            val_cur += 1
+            self.assertFalse(expression.packed())
+            self.assertAlmostEqual(val_cur.get_original(), original, 1)
+
+        # compact all operand types
+        history = [1 << 40, rosslt.Operator.ADD, (1 << 70) + 1, 2.5, 1j, "\u00e4", rosslt.Operator.SWAP]
+        expression = rosslt.Expression(history)
+        expression.compact()
+        self.assertEqual(len(expression), len(history))
+        self.assertEqual(expression.history(), history)
+
+    def test_parse(self):
+
+        # every literal repr can produce
+        history = [1, -7, 2 ** 70, 1e-05, -2.5e+300, float("inf"), float("-inf"), 0.1, -0.0,
+                   3j, (1-2.5j), "a;b", "it's", 'say "hi"', rosslt.Operator.SWAP, rosslt.Operator.POW]
+        expression = rosslt.Expression.from_string(str(rosslt.Expression(history)))
+        self.assertEqual(expression.history(), history)
+        self.assertEqual(len(expression), len(history))
+
+        # types are preserved
+        for parsed, original in zip(expression.elements(), history):
+            self.assertIs(type(parsed), type(original))
+
+        # not a number
+        expression = rosslt.Expression.from_string("nan;1;+")
+        self.assertTrue(math.isnan(expression.history()[0]))
+
+    def test_codec(self):
+
+        # assert wire layout
+        history = [1, rosslt.Operator.ADD, 1 << 40, rosslt.Operator.SUB, 2.5, rosslt.Operator.MUL]
+        elements, data = bytearray(), bytearray()
+        codec.encode(history, elements, data)
+        self.assertEqual(bytes(elements), bytes((1, 65, 2, 66, 3, 68)))
+        self.assertEqual(bytes(data), pack("<iqd", 1, 1 << 40, 2.5))
+
+        # assert bulk decoding with and without sequential operands
+        for operand in (None, 1j, "test"):
+            history_operand = history + ([operand] if operand else [])
+            elements, data = bytearray(), bytearray()
+            codec.encode(history_operand, elements, data)
+            self.assertEqual(codec.decode(elements, data), history_operand)
+
+        # assert dense encoding of small and large operands
+        history = [1, rosslt.Operator.ADD, 300, rosslt.Operator.SUB, 0.5, rosslt.Operator.MUL,
+                   0.1, rosslt.Operator.DIV, -(1 << 80), rosslt.Operator.SWAP, rosslt.Operator.ADD, 7]
+        elements, data = bytearray(), bytearray()
+        codec.encode(history, elements, data, True)
+        self.assertEqual(len(elements), 7)
+        self.assertEqual(len(data), 1 + 2 + 4 + 8 + 12 + 1)
+        self.assertEqual(codec.count(elements), len(history))
+        self.assertEqual(list(codec.iter_decode(elements, data)), history)
+        self.assertEqual(codec.decode(elements, data), history)
+        self.assertEqual(codec.decode(elements[:4], data[:15]), history[:8])
+
+    @unittest.skipIf(np is None, "numpy missing")
+    def test_batch(self):
+
+        # run n times
+        for n in range(self.iterations // 10):
+
+            # integer and float start values
+            for is_float in (False, True):
+                values = np.arange(-50, 50) * (0.5 if is_float else 1)
+                val_cur = Tracked(values.dtype.type(0).item())
+
+                # apply random operations without division
+                for _ in range(self.rng.randint(0, 16)):
+                    operand = self.rng.randint(1, 9)
+                    val_cur = apply_random(val_cur, self.rng, operand, False)
+                    if self.rng.random() < 0.2:
+                        val_cur = operand - val_cur
+                    if not is_float and self.rng.random() < 0.1:
+                        val_cur //= operand
+
+                # assert batch matches scalar evaluation
+                for expression in (val_cur.get_expression(), val_cur.get_expression().reverse()):
+                    result = expression.evaluate_batch(values)
+                    expected = [expression(x) for x in values.tolist()]
+                    self.assertEqual(result.tolist(), expected)
+                    self.assertEqual(result.dtype.kind, values.dtype.kind)
+
+        # out of domain values behave like scalar evaluation
+        values = np.array([-4.0, 0.0, 4.0])
+        val_cur = Tracked(0.5)
+        with self.assertRaises(ValueError):
+            val_cur.asin().get_expression().evaluate_batch(values)
+        with self.assertRaises(ZeroDivisionError):
+            (0.0 / val_cur).get_expression().evaluate_batch(np.array([0.0]))
+        with self.assertRaises(ZeroDivisionError):
+            (1.0 / val_cur).get_expression().evaluate_batch(values)
+        expression = (val_cur ** 0.5).get_expression()
+        result = expression.evaluate_batch(values)
+        self.assertTrue(np.allclose(result, [expression(x) for x in values.tolist()]))
+
+        # undefined arithmetic results in nan like scalar evaluation
+        values = np.array([math.inf, 1.0])
+        for history in ([math.inf, rosslt.Operator.SUB], [0.0, rosslt.Operator.MUL], [math.inf, rosslt.Operator.DIV]):
+            expression = rosslt.Expression(history)
+            result = expression.evaluate_batch(values)
+            expected = [expression(x) for x in values.tolist()]
+            self.assertTrue(np.allclose(result, expected, equal_nan=True))
+            self.assertTrue(math.isnan(expected[0]))
+
     def test_dependencies(self):
 
         def blackbox(a, b):
@@ -1,6 +1,8 @@
 import unittest
 import random
-from rosslt import Tracked
+import rosslt
+import rosslt_py_msgs.msg
+from rosslt import Tracked, Expression, apply_random
 from visualization_msgs.msg import Marker
 from std_msgs.msg import Int32
 from rosslt_py_msgs.msg import TrackedMarker, TrackedInt32
@@ -40,6 +42,70 @@ class TestMessage(unittest.TestCase):
         # reverse value
         self.assertEqual(int32_new.data.get_original(), original)
 
+    def test_packed(self):
+
+        # build expression
+        val_start = self.rng.random()
+        val_cur = Tracked(val_start)
+        for _ in range(200):
+            val_cur = apply_random(val_cur, self.rng, self.rng.random())
+        val_cur = (val_cur + 1) // 2
+        expression = val_cur.get_expression()
+
+        # all message variants
+        for config in ({"msg_str": False, "zlib_enable": False},
+                       {"msg_str": False, "zlib_enable": False, "msg_dense": True},
+                       {"msg_str": False, "zlib_enable": True, "zlib_threshold": 0},
+                       {"msg_str": True, "zlib_enable": False},
+                       {"msg_str": True, "zlib_enable": True, "zlib_threshold": 0},
+                       {"msg_str": False, "zlib_threshold": 0, "compression_codec": "lzma"},
+                       {"msg_str": True, "zlib_threshold": 0, "compression_codec": "bz2"}):
+            rosslt.config_parse(config)
+            try:
+                packed = Expression.from_message(expression.to_message())
+            finally:
+                rosslt.config_load()
+
+            # metadata
+            self.assertEqual(len(packed), len(expression))
+            self.assertEqual(packed.histogram(), expression.histogram())
+            self.assertFalse(packed.invertible())
+
+            # forward and reverse evaluation
+            self.assertEqual(packed(val_start), expression(val_start))
+            self.assertEqual(packed.reverse()(val_cur), expression.reverse()(val_cur))
+
+            # verify that expression is still packed
+            self.assertTrue(packed.packed())
+            self.assertTrue(packed.reverse().packed())
+
+            # compressed buffers are decompressed once
+            if packed._packed.compression & ~rosslt.codec.ExpressionMsgCompression.STRING:
+                self.assertIs(packed._source(), packed._source())
+
+    def test_adaptive(self):
+
+        # expressions with integer and float operands
+        rosslt.config_parse({"msg_adaptive": True})
+        rosslt.strategy.adaptive.reset()
+        try:
+            for start in (1, 0.5) * 20:
+                val_cur = Tracked(start)
+                for _ in range(50):
+                    val_cur = apply_random(val_cur, self.rng, self.rng.randint(1, 9))
+                expression = val_cur.get_expression()
+
+                # all candidates decode to the same expression
+                packed = Expression.from_message(expression.to_message())
+                choice = expression.message_choice()
+                self.assertIn(choice.level, rosslt.strategy.AdaptiveStrategy.LEVELS)
+                self.assertEqual(str(packed), str(expression))
+        finally:
+            rosslt.config_load()
+
+        # every message was recorded
+        self.assertEqual(sum(rosslt.strategy.adaptive.choices.values()), 40)
+
     def test_marker(self):
 
         # tracked marker
@@ -80,6 +146,230 @@ class TestMessage(unittest.TestCase):
         self.assertAlmostEqual(marker_new.pose.position.y.get_original(), original, 2)
         self.assertAlmostEqual(marker_new.pose.position.z.get_original(), original, 2)
 
+    def test_header(self):
+
+        # tracked marker with locations of two nodes
+        marker = Tracked(Marker())
+        marker.pose.position.x = self.rng.random()
+        marker.pose.position.y = self.rng.random()
+        marker.get_location().content_get("pose").node = "other"
+
+        # each node is stored once
+        header = marker.to_msg(TrackedMarker).loc
+        self.assertEqual(list(header.nodes), ["", "other"])
+        marker_new = Tracked.from_msg(marker.to_msg(TrackedMarker))
+        self.assertEqual(marker_new.get_location().content_get("pose").node, "other")
+
+        # unchanged locations reuse encoded messages
+        marker.pose.position.x += 1.0
+        header_new = marker.to_msg(TrackedMarker).loc
+        reused = [a is b for a, b in zip(header.locations, header_new.locations)]
+        self.assertEqual(reused.count(False), 1)
+
+    def test_table(self):
+
+        # tracked marker with nested locations
+        marker = Tracked(Marker())
+        marker.pose.position.x = self.rng.random()
+        marker.pose.position.x *= 2.0
+        marker.color.r = self.rng.random()
+
+        # flat arrays in header order
+        table = rosslt.LocationTable.from_location(marker.get_location())
+        self.assertEqual(table.parent[0], -1)
+        self.assertTrue(all(parent < child for child, parent in enumerate(table.parent)))
+        self.assertEqual(table.names[table.name[table.parent[table.names.index("x")]]], "position")
+
+        # header arrays round trip without tree
+        header = table.to_header()
+        table_new = rosslt.LocationTable.from_header(header)
+        self.assertEqual(table_new.parent, table.parent)
+        self.assertEqual(table_new.names, table.names)
+        self.assertEqual(list(table_new.to_header().graph), list(header.graph))
+        self.assertEqual(str(table_new.to_location()), str(marker.get_location()))
+
+    def test_lazy(self):
+
+        # tracked marker with nested locations
+        marker = Tracked(Marker())
+        marker.pose.position.x = self.rng.random()
+        marker.scale.x = self.rng.random()
+        marker.pose.position.x += 1.0
+        msg = marker.to_msg(TrackedMarker)
+
+        # children are created on access only
+        marker_new = Tracked.from_msg(msg)
+        location = marker_new.get_location()
+        self.assertIsNone(location._content)
+        self.assertEqual(marker_new.pose.position.x, marker.pose.position.x)
+        self.assertIsNone(location.content_get("scale")._content)
+
+        # reverse accessed value
+        self.assertAlmostEqual(marker_new.pose.position.x.get_original(), marker.pose.position.x.get_original())
+
+        # full tree on demand
+        self.assertEqual(str(location), str(marker.get_location()))
+
+    def test_cache(self):
+
+        # same header received twice
+        marker = Tracked(Marker())
+        marker.pose.position.x = self.rng.random()
+        marker.pose.position.x *= 3.0
+        cache = rosslt.location_table.header_cache
+        hits, misses = cache.hits, cache.misses
+        first = Tracked.from_msg(marker.to_msg(TrackedMarker))
+        second = Tracked.from_msg(marker.to_msg(TrackedMarker))
+        self.assertEqual((cache.hits - hits, cache.misses - misses), (1, 1))
+
+        # modifying one received value does not affect the other
+        first.pose.position.x += 1.0
+        self.assertAlmostEqual(first.pose.position.x.get_original(), marker.pose.position.x.get_original())
+        self.assertEqual(str(second.pose.position.x.get_expression()), str(marker.pose.position.x.get_expression()))
+        self.assertNotEqual(str(first.get_location()), str(second.get_location()))
+
+        # changed expression misses
+        marker.pose.position.x += 1.0
+        Tracked.from_msg(marker.to_msg(TrackedMarker))
+        self.assertEqual(cache.misses - misses, 2)
+
+    def test_fragments(self):
+
+        # pose fields sharing transforms, z with additional operations
+        marker = Tracked(Marker())
+        for name in ("x", "y", "z"):
+            setattr(marker.pose.position, name, self.rng.random())
+        for _ in range(10):
+            scale, offset = self.rng.random(), self.rng.random()
+            marker.pose.position.x = marker.pose.position.x * scale + offset
+            marker.pose.position.y = marker.pose.position.y * scale + offset
+            marker.pose.position.z = marker.pose.position.z * scale + offset
+        marker.pose.position.z -= 1.0
+        marker.pose.position.z /= 2.0
+
+        # header with shared fragments is smaller
+        size = sum(len(x.expr.data) for x in marker.to_msg(TrackedMarker).loc.locations)
+        rosslt.config_parse({"header_fragments": True})
+        try:
+            msg = marker.to_msg(TrackedMarker)
+        finally:
+            rosslt.config_load()
+        self.assertEqual(len(msg.loc.fragments), 1)
+        self.assertLess(sum(len(x.expr.data) for x in msg.loc.locations), size / 2)
+
+        # expressions are restored from fragments
+        marker_new = Tracked.from_msg(msg)
+        for name in ("x", "y", "z"):
+            self.assertEqual(str(getattr(marker_new.pose.position, name).get_expression()),
+                             str(getattr(marker.pose.position, name).get_expression()))
+
+    def test_delta(self):
+
+        # tracked marker with several locations
+        marker = Tracked(Marker())
+        marker.pose.position.x = self.rng.random()
+        marker.pose.position.y = self.rng.random()
+        marker.scale.x = self.rng.random()
+        encoder = rosslt.stream.DeltaEncoder(keyframe=8)
+        decoder = rosslt.stream.DeltaDecoder()
+        for n in range(20):
+            marker.pose.position.x += self.rng.random()
+            header = encoder.encode(marker.to_msg(TrackedMarker).loc)
+
+            # only changed location is sent between keyframes
+            full = marker.get_location().header_create()
+            if n % 9:
+                self.assertLess(len(header.locations), len(full.locations))
+                self.assertEqual(len(header.graph), 0)
+
+            # subscriber patches base into full tree
+            decoded = decoder.decode(header)
+            self.assertEqual(len(decoded.locations), len(full.locations))
+            marker_new = Tracked(Marker(), decoded)
+            self.assertEqual(str(marker_new.get_location()), str(marker.get_location()))
+
+        # deltas of unknown base are dropped
+        self.assertIsNone(rosslt.stream.DeltaDecoder().decode(header))
+
+    def test_delta_paths(self):
+
+        # names containing the path separator do not collide with nested locations
+        def header(value):
+            locations = [rosslt_py_msgs.msg.Location(id=n, node=0, name=name, expr=Expression([n, value]).to_message())
+                         for n, name in enumerate(("", "a/b", "a", "b"))]
+            return rosslt_py_msgs.msg.LocationHeader(locations=locations, graph=[0, 1, 0, 2, 2, 3], nodes=["n"])
+        encoder = rosslt.stream.DeltaEncoder()
+        decoder = rosslt.stream.DeltaDecoder()
+        decoder.decode(encoder.encode(header(1.0)))
+
+        # all changed locations are sent and restored
+        delta = encoder.encode(header(2.0))
+        self.assertEqual(len(delta.locations), 4)
+        decoded = decoder.decode(delta)
+        self.assertEqual([x.name for x in decoded.locations], ["", "a/b", "a", "b"])
+        self.assertEqual(list(decoded.graph), [0, 1, 0, 2, 2, 3])
+        for location in decoded.locations:
+            self.assertEqual(str(Expression.from_message(location.expr)), f"{location.id};2.0")
+
+    def test_references(self):
+
+        # fixed history created by first node, alternating operators are not chained
+        marker = Tracked(Marker())
+        marker.pose.position.x = 0.5
+        for i in range(20):
+            marker.pose.position.x *= 1.5
+            marker.pose.position.x += i + 1
+        msg = marker.to_msg(TrackedMarker)
+
+        try:
+            # second node stores received history and refers to it
+            rosslt.config_parse({"msg_references": True})
+            rosslt.reference.node = "b"
+            forwarded = Tracked.from_msg(msg)
+            rosslt.reference.store.clear()
+
+            # received history is decoded and stored on first own message
+            self.assertTrue(forwarded.pose.position.x.get_expression().packed())
+            self.assertEqual(len(rosslt.reference.store._items), 0)
+            forwarded.pose.position.x *= 2.0
+            forwarded.pose.position.x -= 1.0
+            msg_new = forwarded.to_msg(TrackedMarker)
+
+            # referencing message is smaller than complete history
+            rosslt.config_parse({"msg_references": False})
+            size = sum(len(x.expr.elements) + len(x.expr.data) for x in forwarded.to_msg(TrackedMarker).loc.locations)
+            size_new = sum(len(x.expr.elements) + len(x.expr.data) for x in msg_new.loc.locations)
+            self.assertLess(size_new, size / 2)
+
+            # third node resolves complete history
+            rosslt.config_parse({"msg_references": True})
+            rosslt.reference.node = "c"
+            received = Tracked.from_msg(msg_new)
+            self.assertEqual(str(received.pose.position.x.get_expression()),
+                             str(forwarded.pose.position.x.get_expression()))
+            self.assertAlmostEqual(received.pose.position.x.get_original(), 0.5)
+
+            # unknown references are kept and evaluation fails until they are resolved
+            stored = dict(rosslt.reference.store._items)
+            rosslt.reference.store.clear()
+            rosslt.reference.cache.clear()
+            rosslt.location_table.header_cache.clear()
+            received = Tracked.from_msg(msg_new)
+            expression = received.pose.position.x.get_expression()
+            self.assertIs(type(next(expression.elements())), rosslt.codec.ExpressionReference)
+            with self.assertRaises(RuntimeError):
+                received.pose.position.x.get_original()
+            self.assertIsNone(rosslt.reference.resolve(rosslt.codec.ExpressionReference("d", 0, 0)))
+
+            # response of upstream node arrives later
+            for key, msg in stored.items():
+                rosslt.reference.store.put(key, msg)
+            self.assertAlmostEqual(received.pose.position.x.get_original(), 0.5)
+
+        finally:
+            rosslt.reference.node = None
+            rosslt.config_load()
+
 
 if __name__ == "__main__":
     unittest.main()
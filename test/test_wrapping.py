@@ -2,7 +2,7 @@ import copy
 import pickle
 import random
 import unittest
-from rosslt import Tracked
+from rosslt import Tracked, TrackedFloat, TrackedInt
 from visualization_msgs.msg import Marker
 
 
@@ -76,6 +76,73 @@ class TestWrapping(unittest.TestCase):
         self.assertFalse(isinstance(Tracked(5), int))
         self.assertFalse(isinstance(Tracked(Marker()), Marker))
 
+    def test_scalar(self):
+
+        # specialized classes for numeric scalars
+        self.assertIs(type(Tracked(1.5)), TrackedFloat)
+        self.assertIs(type(Tracked(2)), TrackedInt)
+        self.assertIs(type(Tracked("a")), Tracked)
+        self.assertIsInstance(Tracked(2), Tracked)
+
+        # integer operations until division
+        val = Tracked(3)
+        val = 2 * (val + 4)
+        self.assertIs(type(val), TrackedInt)
+        val /= 4
+        self.assertIs(type(val), TrackedFloat)
+        val = val * 3 - Tracked(1.5)
+        self.assertEqual(val, 9.0)
+        self.assertEqual(val.get_original(), 3)
+
+    def test_proxy(self):
+
+        # generated class per message type
+        marker = Tracked(Marker())
+        self.assertIs(type(marker), type(Tracked(Marker())))
+        self.assertIsInstance(marker, Tracked)
+        self.assertIsInstance(vars(type(marker))["pose"], property)
+
+        # nested messages use their own class
+        self.assertIsNot(type(marker.pose), type(marker))
+        self.assertIs(type(Tracked(Marker()).pose), type(marker.pose))
+
+        # plain classes keep forwarding attributes
+        class A:
+            pass
+
+        self.assertIs(type(Tracked(A())), Tracked)
+
+    def test_slots(self):
+
+        # tracked field without instance dictionaries
+        marker = Tracked(Marker())
+        marker.pose.position.x = 1.0
+        value = marker.pose.position.x
+        for obj in (value, value.get_location(), value.get_expression()):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+        # attributes of data are still forwarded
+        self.assertEqual(marker.pose.position.x, 1.0)
+        with self.assertRaises(AttributeError):
+            marker.pose.missing
+
+    def test_read(self):
+
+        # reading fields creates no locations
+        marker = Tracked(Marker())
+        value = marker.pose.position.x
+        self.assertEqual(value, 0.0)
+        self.assertIsNone(marker._loc)
+        self.assertIsNone(value._loc)
+        self.assertIs(marker.pose.position.x, value)
+
+        # modification creates locations along path
+        marker.pose.position.x += 1.0
+        position = marker.get_location().content_get("pose").content_get("position")
+        self.assertTrue(position.content_has("x"))
+        self.assertFalse(position.content_has("y"))
+        self.assertEqual(marker.pose.position.x.get_original(), 0.0)
+
     def test_marker(self):
 
         # tracked marker